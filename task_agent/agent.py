@@ -3,57 +3,377 @@ Smart Agent powered by Claude.
 Implements an adaptive planning loop that re-evaluates and updates plans each turn.
 """
 
+from __future__ import annotations
+
 import os
+import re
 import json
+import atexit
+import itertools
 import logging
-from typing import List, Dict, Any, Optional, Tuple
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import cached_property
+from typing import Callable, List, Dict, Any, Optional, Tuple, Union
 from datetime import datetime
+import httpx
 from anthropic import Anthropic
 
 from models import (
-    Session, Goal, AgentState, Plan, PlanStep, Action, BatchAction,
-    HistoryEntry, HistorySummary, TokenBudget, TurnResult, ExecutionResult, BatchExecutionResult,
-    SessionStatus, StepStatus, TextSpan, generate_id, FailureStrategy,
+    Session, AgentState, Plan, Action, BatchAction,
+    HistoryEntry, HistorySummary, TurnResult, ExecutionResult, BatchExecutionResult,
+    SessionStatus, StepStatus, generate_id, FailureStrategy,
     ClarificationQuestion, ClarificationAnswer, ClarificationEntry,
-    RejectionFeedback, RejectionEntry, CompletedAction, CachedFunctionDetail
+    RejectionFeedback, RejectionEntry, CompletedAction, CachedFunctionDetail, CallStats
 )
 from session_manager import SessionManager
-from tool_client import ToolRegistryClient
+from tool_client import ToolRegistryClient, REGISTRY_TOOLS_GUIDE
+from json_utils import compact_json, json_loads
 from constant import (
     DEFAULT_MODEL,
+    ANTHROPIC_LATENCY_BETA,
     DEFAULT_TOOL_REGISTRY_URL,
     CLAUDE_MAX_OUTPUT_TOKENS,
+    CLAUDE_MAX_RETRIES,
+    CLAUDE_HTTP_TIMEOUT_SECONDS,
     SUMMARIZATION_TEMPERATURE,
     TOKEN_ESTIMATION_DIVISOR,
+    CONTEXT_WINDOW_LIMIT,
+    CONTEXT_SUMMARIZE_THRESHOLD,
     MAX_CLARIFICATIONS_IN_CONTEXT,
     MAX_EXECUTION_HISTORY_IN_CONTEXT,
     MAX_CACHED_FUNCTION_DETAILS,
-    MAX_BATCH_SIZE
+    MAX_BATCH_SIZE,
+    MAX_CONCURRENT_REGISTRY_CALLS,
+    MAX_CONCURRENT_CATEGORY_FETCHES,
+    TOOLS_CACHE_TTL_SECONDS,
+    IO_POOL_WORKERS
 )
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
 logger = logging.getLogger(__name__)
 
 
+def setup_logging(level: int = logging.INFO) -> None:
+    """Configure root logging for the app. Call once from the entry point, not on import."""
+    logging.basicConfig(
+        level=level,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+
+
+# Body of a markdown code block, with an optional json language tag
+_FENCE_RE = re.compile(r"```(?:json)?\s*([\s\S]*?)```")
+# Other language tag on the first line of a code block (e.g. "javascript\n"); used
+# with match(string, pos), which anchors at pos (a "^" would only match at index 0)
+_LANG_TAG_RE = re.compile(r"[A-Za-z]{1,14}\n")
+# Stateless, so one decoder serves every parse
+_JSON_DECODER = json.JSONDecoder()
+
+# Plan step icons for prompts (escaped so the prompt bytes don't depend on source encoding)
+_STATUS_ICON = {
+    StepStatus.PLANNED: "\N{WHITE LARGE SQUARE}",
+    StepStatus.IN_PROGRESS: "\N{ANTICLOCKWISE DOWNWARDS AND UPWARDS OPEN CIRCLE ARROWS}",
+    StepStatus.COMPLETED: "\N{WHITE HEAVY CHECK MARK}",
+    StepStatus.FAILED: "\N{CROSS MARK}",
+    StepStatus.SKIPPED: "\N{BLACK RIGHT-POINTING DOUBLE TRIANGLE WITH VERTICAL BAR}\N{VARIATION SELECTOR-16}",
+}
+
+# Markdown shown to the user for a proposed action
+_EXPLAIN_TMPL = """🔧 **Proposed Action**
+
+**Tool:** {category}/{name}
+
+**Parameters:**
+{params}
+
+**Reasoning:** {reasoning}""".format
+
+
+def _fmt_registry_search(result_data: Dict[str, Any], parts: List[str]) -> None:
+    """Append prompt lines for a registry_search result (concise: up to 15 matches)."""
+    if "results" not in result_data:
+        _fmt_registry_generic(result_data, parts)
+        return
+    functions = result_data.get("results", [])
+    total = result_data.get("total", len(functions))
+    append = parts.append
+    append(f"  Found {total} functions:")
+    # Show up to 15 results with key info
+    for func in functions[:15]:
+        get = func.get
+        append(f"    - {get('category', '?')}/{get('name', '?')}: {get('description', '')[:60]}")
+    if total > 15:
+        append(f"    ... and {total - 15} more")
+
+
+def _fmt_registry_list_category(result_data: Dict[str, Any], parts: List[str]) -> None:
+    """Append prompt lines for a registry_list_category result (concise: up to 15 functions)."""
+    if "functions" not in result_data:
+        _fmt_registry_generic(result_data, parts)
+        return
+    functions = result_data.get("functions", [])
+    total = result_data.get("total", len(functions))
+    append = parts.append
+    append(f"  Category has {total} functions:")
+    for func in functions[:15]:
+        get = func.get
+        append(f"    - {get('name', '?')}: {get('description', '')[:60]}")
+    if total > 15:
+        append(f"    ... and {total - 15} more")
+
+
+def _fmt_param(pname: str, pinfo: Dict[str, Any]) -> str:
+    """One parameter line of a registry_get_function result."""
+    get = pinfo.get
+    if get("required", False):
+        return f"      - {pname}: {get('type', 'any')} (REQUIRED)"
+    return f"      - {pname}: {get('type', 'any')} (optional, default={get('default')})"
+
+
+def _fmt_registry_get_function(result_data: Dict[str, Any], parts: List[str]) -> None:
+    """Append prompt lines for a registry_get_function result (full details - this is what the agent needs)."""
+    parts += (
+        "  Function details:",
+        f"    Name: {result_data.get('name')}",
+        f"    Category: {result_data.get('category')}",
+        f"    Description: {result_data.get('description')}",
+    )
+    params_info = result_data.get("parameters", {})
+    if params_info:
+        parts.append("    Parameters:\n" + "\n".join([
+            _fmt_param(pname, pinfo) if isinstance(pinfo, dict)
+            else f"      - {pname}: any (optional, default=None)"
+            for pname, pinfo in params_info.items()
+        ]))
+
+
+_CHUNK_ENCODER = json.JSONEncoder(separators=(",", ":"), ensure_ascii=False)
+
+
+def _dumps_bounded(obj: Any, limit: int) -> str:
+    """
+    Compact JSON of obj, cut to limit characters with a truncation marker.
+    Encodes incrementally and stops once past the limit, so a huge result
+    costs O(limit) instead of a full serialization.
+    """
+    chunks = []
+    size = 0
+    for chunk in _CHUNK_ENCODER.iterencode(obj):
+        chunks.append(chunk)
+        size += len(chunk)
+        if size > limit:
+            return "".join(chunks)[:limit] + "\n... (truncated)"
+    return "".join(chunks)
+
+
+def _fmt_registry_generic(result_data: Any, parts: List[str]) -> None:
+    """Append the prompt line for any other registry result (compact JSON, truncated)."""
+    parts.append(f"  Result: {_dumps_bounded(result_data, 1000)}")
+
+
+# Registry discovery result formatters by meta-tool name
+_REGISTRY_FORMATTERS: Dict[str, Callable[[Dict[str, Any], List[str]], None]] = {
+    "registry_search": _fmt_registry_search,
+    "registry_list_category": _fmt_registry_list_category,
+    "registry_get_function": _fmt_registry_get_function,
+}
+
+
+# Static system-prompt prefixes. They contain no session data, so together
+# with the tools block they form a byte-identical prefix that Anthropic's
+# prompt cache can reuse across turns and sessions.
+_INITIAL_PLAN_SYSTEM_PROMPT = """You are a planning assistant. Your job is to create an initial plan for achieving the user's goal.
+
+CRITICAL CONSTRAINTS:
+- You can ONLY use tools listed below from the tool registry
+- DO NOT make up or invent tools that are not in the list
+- DO NOT suggest making HTTP requests or API calls directly
+- DO NOT suggest using any external services not in the tool registry
+- If a required capability is not available in the tools, note it as a blocker
+
+INSTRUCTIONS:
+1. Break down the goal into actionable steps that can be accomplished with the AVAILABLE TOOLS ONLY
+2. For each step, identify the EXACT text span in the original goal that it corresponds to
+3. Order steps logically (dependencies first)
+4. If a step cannot be done with available tools, mark it clearly and explain why
+
+Your response must be valid JSON:
+{
+    "state_summary": "Initial understanding of the goal...",
+    "plan": [
+        {
+            "description": "What this step accomplishes",
+            "text_span": {
+                "start": <start char index>,
+                "end": <end char index>,
+                "text": "<exact text from goal>"
+            }
+        },
+        ...
+    ],
+    "reasoning": "Why this plan makes sense...",
+    "confidence": 0.0-1.0
+}
+
+Only respond with JSON, no additional text."""
+
+_EVALUATION_SYSTEM_PROMPT = f"""You are a continuous planning agent. Each turn, you evaluate the situation and decide the next action OR ask the user a clarification question.
+
+CRITICAL CONSTRAINTS - YOU MUST FOLLOW THESE:
+- You can ONLY use tools listed below from the tool registry
+- DO NOT make up, invent, or hallucinate tools that are not in the list below
+- DO NOT suggest making direct HTTP requests, API calls, or web requests
+- DO NOT suggest using external services, websites, or APIs not in the tool registry
+- If the next step requires a capability not in the available tools, set "next_actions" to null and explain in "blockers"
+- Every tool_category and tool_name you propose MUST exist in the AVAILABLE TOOLS list below
+- PARAMETER NAMES MUST MATCH EXACTLY as shown in the tool registry (e.g., if registry shows "data", use "data" NOT "fields")
+
+REGISTRY DISCOVERY TOOLS (auto-executed, no approval needed):
+- registry/registry_search: Search for functions by keyword - USE THIS to find functions
+- registry/registry_list_category: List all functions in a category
+- registry/registry_get_function: Get full details of a specific function (ALWAYS use before calling a function!)
+These tools are executed automatically without user approval. Use them freely to discover what functions are available and their exact parameter names BEFORE proposing an actual action.
+
+IMPORTANT: Check DISCOVERED FUNCTIONS first! If you see a function name already listed there, you don't need to search for it again.
+Also check CACHED FUNCTION DETAILS - if a function's full details are already cached, you can use it immediately without calling registry_get_function.
+
+ACTION EXECUTION:
+Propose actions using "next_actions" array (1 to {MAX_BATCH_SIZE} actions per turn).
+
+WHEN TO USE MULTIPLE ACTIONS:
+- Independent operations that don't depend on each other's results
+- Same tool with different parameters (e.g., add 5 users, create 3 issues)
+- Parallel-safe operations where order doesn't matter
+- Reduces turns and improves efficiency
+
+WHEN TO USE SINGLE ACTION:
+- Action result needed to decide next step
+- Complex operations requiring validation
+- When in doubt, start with one action
+
+FAILURE STRATEGIES (required when len(next_actions) > 1):
+- "continue": Execute all actions regardless of failures (best for independent ops like bulk user additions)
+- "stop_on_error": Stop immediately on first error and skip remaining (best for sequential dependencies)
+
+YOUR RESPONSIBILITIES:
+1. Evaluate progress toward the goal
+2. Update the plan if needed (add/remove/reorder steps)
+3. DECIDE: Propose action(s) OR ask clarification question(s)
+   - Propose ACTIONS if you have enough information to proceed confidently
+   - Ask CLARIFICATION QUESTIONS if:
+     * Information is ambiguous or incomplete
+     * Multiple valid interpretations exist
+     * Making an assumption could lead to wrong results
+     * User preferences are needed for decisions
+   - You can ask multiple related questions at once
+4. If the goal is fully achieved, indicate so
+5. If stuck due to missing tools, explain clearly
+
+IMPORTANT:
+- Never lose sight of the original goal
+- Use results from previous actions to inform decisions
+- If stuck, explain what's blocking progress
+- Use EXACT parameter names as listed in AVAILABLE TOOLS - do not rename or remap parameters
+- ONLY use tools that exist in the registry - verify before proposing
+- WHEN UNCERTAIN, ASK - don't make assumptions that could waste time or cause errors"""
+
+
+# Response-format instructions appended to every evaluation prompt.
+# Built once at import: only MAX_BATCH_SIZE is interpolated, so the text is
+# byte-identical across turns.
+_EVALUATION_RESPONSE_FORMAT = f"""Evaluate the situation and respond with JSON:
+{{
+    "goal_achieved": true/false,
+    "state_summary": "Updated understanding of the situation...",
+    "completed_objectives": ["objective 1", ...],
+    "blockers": ["any issues..."],
+    "plan_updates": {{
+        "add_steps": [{{"description": "...", "after_step_id": "..." or null}}],
+        "remove_step_ids": ["step_id", ...],
+        "update_steps": [{{"step_id": "...", "new_description": "..."}}]
+    }},
+    
+    // CHOOSE ONE: Either "next_actions" (1 or more) OR "clarification_questions" (1 or more)
+    
+    // Propose action(s):
+    "next_actions": [
+        {{
+            "plan_step_id": "which step this fulfills",
+            "tool_category": "category",
+            "tool_name": "function_name",
+            "parameters": {{...use EXACT parameter names from tool registry...}},
+            "reasoning": "why this specific action"
+        }}
+        // ... up to {MAX_BATCH_SIZE} actions total
+    ] or null,
+    "failure_strategy": "continue" or "stop_on_error",  // Required if next_actions.length > 1
+    
+    // OR ask for clarification:
+    "clarification_questions": [
+        {{
+            "question": "What specific information do you need?",
+            "context": "Why you need this information",
+            "options": ["Option A", "Option B"] or [],
+            "related_step_id": "step_id this relates to" or null
+        }}
+        // ... can ask multiple related questions
+    ] or null,
+    
+    "reasoning": "overall analysis..."
+}}
+
+REMINDER: 
+- When specifying "parameters", use the EXACT parameter names shown in AVAILABLE TOOLS.
+- Always use "next_actions" array (even for single action). Include "failure_strategy" if len > 1.
+- If you need clarification, set "next_actions" to null and provide "clarification_questions" array.
+- If you have enough info to proceed, set "clarification_questions" to null and provide "next_actions".
+- Don't ask unnecessary questions - only ask when genuinely uncertain about something important.
+- You can ask multiple related questions at once if they're all needed.
+- If the user's answer to a previous clarification is itself a question or challenge, ask another clarification question to address their concern.
+- ALWAYS respond with valid JSON - never respond with plain text."""
+
+_SUMMARIZATION_SYSTEM_PROMPT = """You are a summarization assistant. Summarize the execution history concisely.
+Focus on:
+1. What actions were taken
+2. Key results and outcomes
+3. Any failures or issues encountered
+
+Keep it brief but capture essential information for continuing the task."""
+
+
 class ContinuousPlanningAgent:
     """
     AI Agent that continuously evaluates, plans, and executes.
     Each turn: Evaluate state → Update plan → Propose action → Execute with approval.
     """
     
+    # Anthropic clients shared by every agent in the process, keyed by API key
+    _clients: Dict[str, Anthropic] = {}
+    _clients_lock = threading.Lock()
+    
+    # Worker threads for outbound I/O (registry fan-out), shared by every agent
+    _io_pool = ThreadPoolExecutor(max_workers=IO_POOL_WORKERS, thread_name_prefix="agent-io")
+    
     def __init__(
         self,
         session_manager: SessionManager,
         tool_client: ToolRegistryClient,
-        model: str = DEFAULT_MODEL
+        model: str = DEFAULT_MODEL,
+        latency_mode: bool = True,
+        clock: Callable[[], float] = time.time
     ):
         self.session_manager = session_manager
         self.tool_client = tool_client
         self.model = model
+        self._clock = clock  # Epoch seconds for agent-created timestamps (stubbable in tests)
+        
+        # Latency-optimized requests for planning/evaluation calls. Only sent when a
+        # beta flag is configured, since support depends on the model and endpoint.
+        self._latency_headers: Optional[Dict[str, str]] = (
+            {"anthropic-beta": ANTHROPIC_LATENCY_BETA}
+            if latency_mode and ANTHROPIC_LATENCY_BETA else None
+        )
         
         # Check for API key
         api_key = os.environ.get("ANTHROPIC_API_KEY")
@@ -65,19 +385,79 @@ class ContinuousPlanningAgent:
                 "Please set it before running the agent."
             )
         
-        logger.info(f"Initializing Anthropic client with model: {model}")
+        logger.info(f"Agent configured with model: {model}")
         logger.info(f"API key found: {api_key[:8]}...{api_key[-4:]}")
-        self.client = Anthropic(api_key=api_key)
+        self._api_key = api_key
         
-        # Cache available tools
+        # Cache available tools, keyed by registry version
         self._tools_cache: Optional[str] = None
+        self._tools_cache_time = 0.0  # time.monotonic() of the last registry fetch
         # _tools_list removed - agent discovers tools on-demand via registry meta-tools
-        self._available_categories: set = set()
-        self._available_tools: Dict[str, bool] = {}
+        self._available_categories: frozenset = frozenset()
+        self._available_tools: frozenset = frozenset()  # (category, name) pairs
+        self._registry_total: Optional[int] = None  # Function count reported by the registry
+        
+        # Rendered prompt sections: name -> ((session id, version), text)
+        self._format_cache: Dict[str, Tuple[Tuple[str, int], str]] = {}
+        
+        # Formatted registry results of the current turn: (results list, calls formatted, lines)
+        self._registry_fmt_cache: Optional[Tuple[List[Dict[str, Any]], int, List[str]]] = None
+        
+        # Background history summary: (session id, summarized entries, future)
+        self._pending_summary: Optional[Tuple[str, List[HistoryEntry], Future]] = None
+        
+        # Sequence for process-local IDs (see _next_local_id)
+        self._id_counter = itertools.count()
         
         # History summarization threshold
         self.max_history_entries = 10
         self.summarize_after = 7
+        
+        # Auto-executed registry discovery calls allowed per turn before giving up
+        self.max_registry_calls = 10
+        
+        # Once a session has used some categories, send a short category index
+        # instead of the full registry overview (set False to always send it)
+        self.compact_tools_context = True
+    
+    @classmethod
+    def _get_client(cls, api_key: str) -> Anthropic:
+        """Get the process-wide Anthropic client for this API key, creating it on first use."""
+        with cls._clients_lock:
+            client = cls._clients.get(api_key)
+            if client is None:
+                logger.info("Initializing shared Anthropic client")
+                # One pooled HTTP client per key keeps connections (and TLS sessions)
+                # warm across agents and sessions
+                client = Anthropic(
+                    api_key=api_key,
+                    max_retries=CLAUDE_MAX_RETRIES,
+                    http_client=httpx.Client(
+                        limits=httpx.Limits(max_connections=50, max_keepalive_connections=20),
+                        timeout=httpx.Timeout(CLAUDE_HTTP_TIMEOUT_SECONDS)
+                    )
+                )
+                cls._clients[api_key] = client
+            return client
+    
+    @classmethod
+    def _map_io(cls, fn: Callable[[Any], Any], items: List[Any], max_concurrency: int) -> List[Any]:
+        """
+        Run fn over items on the shared I/O pool, at most max_concurrency at a time.
+        Results are returned in input order.
+        """
+        limiter = threading.BoundedSemaphore(max_concurrency)
+        
+        def run(item: Any) -> Any:
+            with limiter:
+                return fn(item)
+        
+        return list(cls._io_pool.map(run, items))
+    
+    @cached_property
+    def client(self) -> Anthropic:
+        """Anthropic client, created lazily so agents that never call Claude don't build one."""
+        return self._get_client(self._api_key)
     
     @property
     def current_session(self) -> Optional[Session]:
@@ -88,150 +468,229 @@ class ContinuousPlanningAgent:
         Get formatted context about available tools for the agent prompt.
         The agent only sees a lightweight summary, NOT all function definitions.
         
-        Refreshes from registry every turn to get current state.
+        The summary and validation cache are reused for TOOLS_CACHE_TTL_SECONDS
+        (the registry exposes no version or ETag to check against), so the tools
+        text stays byte-identical (and prompt-cacheable) between turns.
         """
+        if (self._tools_cache is not None
+                and time.monotonic() - self._tools_cache_time <= TOOLS_CACHE_TTL_SECONDS):
+            return self._tools_cache
+        
         logger.info("Refreshing tools context from registry...")
-        self._tools_cache = self.tool_client.get_tools_summary()
-        
-        # Also refresh validation cache (list of valid tool names)
-        self._available_categories = set(self.tool_client.list_categories())
-        self._available_tools = {}
-        for cat in self._available_categories:
-            funcs = self.tool_client.get_functions_by_category(cat)
-            for func in funcs:
-                if isinstance(func, str):
-                    self._available_tools[f"{cat}/{func}"] = True
-                else:
-                    self._available_tools[f"{cat}/{func.get('name', '')}"] = True
+        category_list = self.tool_client.list_categories()
+        self._registry_total = self.tool_client.count_functions()
+        self._tools_cache = self.tool_client.get_tools_summary(category_list, self._registry_total)
+        self._tools_cache_time = time.monotonic()
+        
+        # Also refresh validation cache (set of valid tool keys)
+        self._available_categories = frozenset(category_list)
+        categories = list(self._available_categories)
+        # One request per category; fetch them in parallel (bounded to spare the registry)
+        category_funcs = self._map_io(
+            self.tool_client.get_functions_by_category, categories, MAX_CONCURRENT_CATEGORY_FETCHES
+        )
+        self._available_tools = frozenset(
+            (cat, func if isinstance(func, str) else func.get('name', ''))
+            for cat, funcs in zip(categories, category_funcs)
+            for func in funcs
+        )
         
         logger.info(f"Registry: {len(self._available_tools)} tools across {len(self._available_categories)} categories")
         return self._tools_cache
     
+    def invalidate_tool_cache(self) -> None:
+        """Drop the cached registry listing so the next lookup refetches it."""
+        self._tools_cache = None
+        self._available_categories = frozenset()
+        self._available_tools = frozenset()
+    
+    def _get_evaluation_tools_context(self) -> str:
+        """
+        Tools context for evaluation prompts.
+        
+        Falls back to the full registry overview until the session has used a
+        category; after that the category list is shortened to an index of used and
+        other categories. The meta-tool parameter guide is always kept, since it is
+        the only place those parameters are defined; signatures of used functions
+        are in CACHED FUNCTION DETAILS.
+        """
+        tools_context = self._get_tools_context()
+        used = self.current_session.state.context.get("used_categories")
+        if not self.compact_tools_context or not used:
+            return tools_context
+        
+        other = sorted(self._available_categories.difference(used))
+        total = self._registry_total
+        return f"""TOOL REGISTRY OVERVIEW:
+Total Functions: {total if total is not None else 'unknown'}
+Categories used this session: {', '.join(used)}
+Other categories: {', '.join(other) if other else 'N/A'}
+
+{REGISTRY_TOOLS_GUIDE}"""
+    
+    def _mark_category_used(self, category: str) -> None:
+        """Record a tool category the session has worked with (kept sorted for a stable prompt)."""
+        if not category or category == "registry":
+            return
+        context = self.current_session.state.context
+        used = context.get("used_categories", [])
+        if category not in used:
+            context["used_categories"] = sorted([*used, category])
+    
     def _validate_tool(self, category: str, tool_name: str) -> Tuple[bool, str]:
         """
         Validate that a tool exists in the registry.
         Returns (is_valid, error_message).
+        
+        Reads the cached registry listing; _get_tools_context only refetches it
+        if it was never loaded or is older than TOOLS_CACHE_TTL_SECONDS.
         """
         # Registry meta-tools are always valid
         if category == "registry" and tool_name in ["registry_search", "registry_list_category", "registry_get_function"]:
             return True, ""
         
-        # Ensure tools are loaded
+        # Ensure tools are loaded and not stale
         self._get_tools_context()
         
-        tool_key = f"{category}/{tool_name}"
+        if (category, tool_name) in self._available_tools:
+            return True, ""
         
         if category not in self._available_categories:
             return False, f"Category '{category}' does not exist in tool registry. Available categories: {list(self._available_categories)}"
         
-        if tool_key not in self._available_tools:
-            available_in_cat = [k.split('/')[1] for k in self._available_tools if k.startswith(f"{category}/")]
-            return False, f"Tool '{tool_name}' does not exist in category '{category}'. Available tools: {available_in_cat}"
+        available_in_cat = [name for cat, name in self._available_tools if cat == category]
+        return False, f"Tool '{tool_name}' does not exist in category '{category}'. Available tools: {available_in_cat}"
+    
+    @staticmethod
+    def _build_system_prompt(
+        instructions: str,
+        tools_context: str,
+        dynamic_context: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Build a structured system prompt for prompt caching.
         
-        return True, ""
+        The static instructions and the tools block are marked as cache
+        breakpoints; session-specific text goes last so it never invalidates
+        the cached prefix.
+        """
+        blocks: List[Dict[str, Any]] = [
+            {"type": "text", "text": instructions, "cache_control": {"type": "ephemeral"}},
+            {
+                "type": "text",
+                "text": f"AVAILABLE TOOLS (from tool registry):\n{tools_context}",
+                "cache_control": {"type": "ephemeral"}
+            },
+        ]
+        if dynamic_context:
+            blocks.append({"type": "text", "text": dynamic_context})
+        return blocks
+    
+    @staticmethod
+    def _blocks_text(content: Union[str, List[Dict[str, Any]]]) -> str:
+        """Plain text of a prompt given as a string or a list of text blocks."""
+        if isinstance(content, str):
+            return content
+        return "\n\n".join(block["text"] for block in content)
     
     def _call_claude(
         self,
-        system_prompt: str,
-        user_message: str,
-        temperature: float = 0.1
-    ) -> Tuple[str, int]:
-        """Make a call to Claude API. Returns (response, tokens_used)."""
+        system_prompt: Union[str, List[Dict[str, Any]]],
+        user_message: Union[str, List[Dict[str, Any]]],
+        temperature: float = 0.1,
+        latency_sensitive: bool = False,
+        max_tokens: int = CLAUDE_MAX_OUTPUT_TOKENS
+    ) -> CallStats:
+        """
+        Make a call to Claude API.
+        Returns the response text with token usage, including prompt-cache reads/writes.
+        
+        latency_sensitive requests use the configured latency beta, if any.
+        """
         logger.info(f"Calling Claude API (model: {self.model})")
-        logger.debug(f"System prompt length: {len(system_prompt)} chars")
-        logger.debug(f"User message length: {len(user_message)} chars")
+        debug = logger.isEnabledFor(logging.DEBUG)
+        if debug:
+            system_text = self._blocks_text(system_prompt)
+            user_text = self._blocks_text(user_message)
+            logger.debug(f"System prompt length: {len(system_text)} chars")
+            logger.debug(f"User message length: {len(user_text)} chars")
         
         try:
-            response = self.client.messages.create(
+            # Stream the response so generation isn't bound by a single blocking
+            # read; text is available as it arrives and the final message carries usage
+            with self.client.messages.stream(
                 model=self.model,
-                max_tokens=CLAUDE_MAX_OUTPUT_TOKENS,
+                max_tokens=max_tokens,
                 temperature=temperature,
                 system=system_prompt,
-                messages=[{"role": "user", "content": user_message}]
-            )
+                messages=[{"role": "user", "content": user_message}],
+                extra_headers=self._latency_headers if latency_sensitive else None
+            ) as stream:
+                response_text = stream.get_final_text()
+                response = stream.get_final_message()
             
-            # Track token usage separately
-            input_tokens = response.usage.input_tokens
-            output_tokens = response.usage.output_tokens
-            total_tokens = input_tokens + output_tokens
-            logger.info(f"Claude response received. Input: {input_tokens}, Output: {output_tokens}, Total: {total_tokens}")
-            all_text = system_prompt + user_message + response.content[0].text
-            print("-" * 100)
-            print(all_text)
-            print("-" * 100)
-            return response.content[0].text, total_tokens, input_tokens
+            # Track token usage separately. With prompt caching, input_tokens only
+            # covers the uncached part of the prompt; cache reads/writes come separately.
+            usage = response.usage
+            stats = CallStats(
+                text=response_text,
+                input_tokens=usage.input_tokens,
+                output_tokens=usage.output_tokens,
+                cache_read=getattr(usage, "cache_read_input_tokens", None) or 0,
+                cache_creation=getattr(usage, "cache_creation_input_tokens", None) or 0
+            )
+            if logger.isEnabledFor(logging.INFO):
+                logger.info(
+                    f"Claude response received. Input: {stats.context_tokens} "
+                    f"(cache read: {stats.cache_read}, cache write: {stats.cache_creation}, "
+                    f"hit ratio: {stats.cache_hit_ratio:.0%}), "
+                    f"Output: {stats.output_tokens}, Total: {stats.total_tokens}"
+                )
+            if debug:
+                # Full prompt/response transcript
+                separator = "-" * 100
+                logger.debug(f"{separator}\n{system_text}{user_text}{response_text}\n{separator}")
+            return stats
         except Exception as e:
             logger.error(f"Error calling Claude API: {e}")
             raise
     
     def _parse_json_response(self, response: str) -> Dict[str, Any]:
         """Parse JSON from Claude's response, handling markdown code blocks and extra text."""
-        original_response = response  # Keep for debugging
-        response = response.strip()
-        
         # Log raw response for debugging
-        logger.debug(f"Raw response to parse (first 500 chars): {response[:500]}")
-        
-        # Handle markdown code blocks - extract content between ```json and ```
-        if "```json" in response:
-            # Find the JSON block
-            start = response.find("```json")
-            if start != -1:
-                start += len("```json")
-                end = response.find("```", start)
-                if end != -1:
-                    response = response[start:end].strip()
-                else:
-                    response = response[start:].strip()
-        elif "```" in response:
-            # Generic code block - find content between first ``` and next ```
-            parts = response.split("```")
-            for part in parts[1:]:  # Skip anything before first ```
-                # Remove language tag if present (e.g., "json\n")
-                if part.strip().startswith("json"):
-                    part = part.strip()[4:].strip()
-                elif "\n" in part:
-                    # Check if first line is a language tag
-                    first_line, rest = part.split("\n", 1)
-                    if first_line.strip().isalpha() and len(first_line.strip()) < 15:
-                        part = rest
-                if "{" in part:
-                    response = part.strip()
-                    break
-        
-        response = response.strip()
-        
-        # Try direct parse first
-        try:
-            return json.loads(response)
-        except json.JSONDecodeError:
-            pass
-        
-        # Try to extract JSON object - find matching braces
-        start_idx = response.find('{')
-        if start_idx == -1:
-            # Last resort: search in original response for any JSON object
-            start_idx = original_response.find('{')
-            if start_idx != -1:
-                response = original_response[start_idx:]
-            else:
-                logger.error(f"No JSON object found in response. Full response: {original_response[:1000]}")
-                raise json.JSONDecodeError("No JSON object found", response, 0)
-        
-        # Find the matching closing brace
-        brace_count = 0
-        end_idx = start_idx
-        for i, char in enumerate(response[start_idx:], start_idx):
-            if char == '{':
-                brace_count += 1
-            elif char == '}':
-                brace_count -= 1
-                if brace_count == 0:
-                    end_idx = i + 1
-                    break
-        
-        json_str = response[start_idx:end_idx]
-        return json.loads(json_str)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Raw response to parse (first 500 chars): {response[:500]}")
+        
+        # Prefer the body of the first markdown code block, then fall back to the
+        # whole response. Everything works on index spans of the original string:
+        # raw_decode parses the first object starting at '{' and ignores whatever
+        # trails it, so neither the block body nor the tail is ever copied.
+        match = _FENCE_RE.search(response)
+        if match is None:
+            # Fast path: the response is exactly one JSON document
+            try:
+                obj = json_loads(response)
+                if isinstance(obj, dict):
+                    return obj
+            except ValueError:
+                pass
+            spans = ((0, len(response)),)
+        else:
+            spans = ((match.start(1), match.end(1)), (0, len(response)))
+        
+        for start, end in spans:
+            tag = _LANG_TAG_RE.match(response, start, end)
+            start_idx = response.find("{", tag.end() if tag else start, end)
+            if start_idx == -1:
+                continue
+            try:
+                obj, _ = _JSON_DECODER.raw_decode(response, start_idx)
+                return obj
+            except json.JSONDecodeError:
+                continue
+        
+        logger.error(f"No JSON object found in response. Full response: {response[:1000]}")
+        raise json.JSONDecodeError("No JSON object found", response, 0)
     
     # ===================
     # Session Initialization
@@ -271,43 +730,7 @@ class ContinuousPlanningAgent:
         tools_context = self._get_tools_context()
         logger.debug(f"Tools context loaded: {len(tools_context)} chars")
         
-        system_prompt = f"""You are a planning assistant. Your job is to create an initial plan for achieving the user's goal.
-
-AVAILABLE TOOLS (from tool registry):
-{tools_context}
-
-CRITICAL CONSTRAINTS:
-- You can ONLY use tools listed above from the tool registry
-- DO NOT make up or invent tools that are not in the list
-- DO NOT suggest making HTTP requests or API calls directly
-- DO NOT suggest using any external services not in the tool registry
-- If a required capability is not available in the tools, note it as a blocker
-
-INSTRUCTIONS:
-1. Break down the goal into actionable steps that can be accomplished with the AVAILABLE TOOLS ONLY
-2. For each step, identify the EXACT text span in the original goal that it corresponds to
-3. Order steps logically (dependencies first)
-4. If a step cannot be done with available tools, mark it clearly and explain why
-
-Your response must be valid JSON:
-{{
-    "state_summary": "Initial understanding of the goal...",
-    "plan": [
-        {{
-            "description": "What this step accomplishes",
-            "text_span": {{
-                "start": <start char index>,
-                "end": <end char index>,
-                "text": "<exact text from goal>"
-            }}
-        }},
-        ...
-    ],
-    "reasoning": "Why this plan makes sense...",
-    "confidence": 0.0-1.0
-}}
-
-Only respond with JSON, no additional text."""
+        system_prompt = self._build_system_prompt(_INITIAL_PLAN_SYSTEM_PROMPT, tools_context)
 
         user_message = f"""Create a plan for this goal:
 
@@ -318,9 +741,12 @@ Only respond with JSON, no additional text."""
 Remember to identify exact text spans for each step."""
 
         try:
-            response, tokens, input_tokens = self._call_claude(system_prompt, user_message)
-            self.session_manager.add_tokens_used(tokens)
-            self.session_manager.update_context_tokens(input_tokens)
+            stats = self._call_claude(
+                system_prompt, user_message, latency_sensitive=True
+            )
+            self.session_manager.add_tokens_used(stats.total_tokens)
+            self.session_manager.update_context_tokens(stats.context_tokens)
+            response = stats.text
             logger.info(f"Initial plan response received")
             
             data = self._parse_json_response(response)
@@ -382,13 +808,19 @@ Remember to identify exact text spans for each step."""
                 error="Token or turn budget exceeded"
             )
         
-        # Summarize history if needed
-        if len(session.history) >= self.summarize_after:
+        # Summarize history if needed (by entry count, or when the last prompt
+        # was already close to the context window). Count-based summaries land in
+        # the background; near the window limit this prompt has to wait for one.
+        self._apply_pending_summary()
+        if self._context_near_limit():
+            self._summarize_history()
+            self._apply_pending_summary(wait=True)
+        elif len(session.history) >= self.summarize_after:
             self._summarize_history()
         
         # Registry results from auto-executed discovery calls
         registry_results: List[Dict[str, Any]] = []
-        max_registry_calls = 10  # Prevent infinite loops
+        max_registry_calls = self.max_registry_calls  # Prevent infinite loops
         
         while len(registry_results) < max_registry_calls:
             # Evaluate and plan (pass registry results if any)
@@ -522,9 +954,16 @@ Remember to identify exact text spans for each step."""
             
             if all_registry:
                 # Auto-execute all registry tools in batch (no approval needed, doesn't count as turn)
+                # The registry requests are independent, so overlap them; cache updates
+                # are applied afterwards on this thread, in proposal order.
                 logger.info(f"Auto-executing batch of {len(actions)} registry tools")
-                for action in actions:
-                    result = self._execute_registry_tool(action.tool_name, action.parameters)
+                results = self._map_io(
+                    lambda a: self._fetch_registry_tool(a.tool_name, a.parameters),
+                    actions,
+                    MAX_CONCURRENT_REGISTRY_CALLS
+                )
+                for action, result in zip(actions, results):
+                    self._record_registry_result(action.tool_name, action.parameters, result)
                     registry_results.append({
                         "tool": action.tool_name,
                         "params": action.parameters,
@@ -547,120 +986,77 @@ Remember to identify exact text spans for each step."""
             status="error",
             session=self.current_session,
             error=f"Agent made too many registry discovery calls ({max_registry_calls}). May be stuck in a loop."
-        )
-    
-    def _evaluate_and_plan(self, registry_results: List[Dict[str, Any]] = None) -> Dict[str, Any]:
-        """
-        Core evaluation: assess current state, update plan, propose action.
-        
-        Args:
-            registry_results: Results from auto-executed registry discovery calls (if any)
-        """
-        logger.info("Starting evaluation and planning...")
-        
-        session = self.current_session
-        if not session:
-            logger.error("No active session for evaluation")
-            return {"goal_achieved": False, "error": "No session"}
-        
-        logger.info(f"Session: {session.id}, Turn: {session.budget.current_turn}")
-        tools_context = self._get_tools_context()
-        
-        # Format current plan
-        plan_str = self._format_plan(session.plan)
-        
-        # Format history
-        history_str = self._format_history(session.history, session.history_summaries)
-        
-        # Include clarifications and rejections in context
-        clarifications_str = self._format_clarifications(session.clarifications)
-        rejections_str = self._format_rejections(session.rejections)
-        
-        # Format completed steps log
-        completed_actions_str = self._format_completed_actions(session.completed_actions)
-        
-        # Format registry discovery results (from auto-executed calls this turn)
-        registry_str = self._format_registry_results(registry_results or [])
-        
-        # Format two-tier tool cache
-        discovered_functions_str = self._format_discovered_functions()
-        cached_details_str = self._format_cached_function_details()
-        
-        system_prompt = f"""You are a continuous planning agent. Each turn, you evaluate the situation and decide the next action OR ask the user a clarification question.
-
-CRITICAL CONSTRAINTS - YOU MUST FOLLOW THESE:
-- You can ONLY use tools listed above from the tool registry
-- DO NOT make up, invent, or hallucinate tools that are not in the list above
-- DO NOT suggest making direct HTTP requests, API calls, or web requests
-- DO NOT suggest using external services, websites, or APIs not in the tool registry
-- If the next step requires a capability not in the available tools, set "next_actions" to null and explain in "blockers"
-- Every tool_category and tool_name you propose MUST exist in the AVAILABLE TOOLS list above
-- PARAMETER NAMES MUST MATCH EXACTLY as shown in the tool registry (e.g., if registry shows "data", use "data" NOT "fields")
-
-REGISTRY DISCOVERY TOOLS (auto-executed, no approval needed):
-- registry/registry_search: Search for functions by keyword - USE THIS to find functions
-- registry/registry_list_category: List all functions in a category
-- registry/registry_get_function: Get full details of a specific function (ALWAYS use before calling a function!)
-These tools are executed automatically without user approval. Use them freely to discover what functions are available and their exact parameter names BEFORE proposing an actual action.
-
-IMPORTANT: Check DISCOVERED FUNCTIONS first! If you see a function name already listed there, you don't need to search for it again.
-Also check CACHED FUNCTION DETAILS - if a function's full details are already cached, you can use it immediately without calling registry_get_function.
-
-ACTION EXECUTION:
-Propose actions using "next_actions" array (1 to {MAX_BATCH_SIZE} actions per turn).
-
-WHEN TO USE MULTIPLE ACTIONS:
-- Independent operations that don't depend on each other's results
-- Same tool with different parameters (e.g., add 5 users, create 3 issues)
-- Parallel-safe operations where order doesn't matter
-- Reduces turns and improves efficiency
-
-WHEN TO USE SINGLE ACTION:
-- Action result needed to decide next step
-- Complex operations requiring validation
-- When in doubt, start with one action
-
-FAILURE STRATEGIES (required when len(next_actions) > 1):
-- "continue": Execute all actions regardless of failures (best for independent ops like bulk user additions)
-- "stop_on_error": Stop immediately on first error and skip remaining (best for sequential dependencies)
-
-YOUR RESPONSIBILITIES:
-1. Evaluate progress toward the goal
-2. Update the plan if needed (add/remove/reorder steps)
-3. DECIDE: Propose action(s) OR ask clarification question(s)
-   - Propose ACTIONS if you have enough information to proceed confidently
-   - Ask CLARIFICATION QUESTIONS if:
-     * Information is ambiguous or incomplete
-     * Multiple valid interpretations exist
-     * Making an assumption could lead to wrong results
-     * User preferences are needed for decisions
-   - You can ask multiple related questions at once
-4. If the goal is fully achieved, indicate so
-5. If stuck due to missing tools, explain clearly
-
-IMPORTANT:
-- Never lose sight of the original goal
-- Use results from previous actions to inform decisions
-- If stuck, explain what's blocking progress
-- Use EXACT parameter names as listed in AVAILABLE TOOLS - do not rename or remap parameters
-- ONLY use tools that exist in the registry - verify before proposing
-- WHEN UNCERTAIN, ASK - don't make assumptions that could waste time or cause errors
-
-AVAILABLE TOOLS (from tool registry):
-{tools_context}
-
-{discovered_functions_str}
-
-{cached_details_str}
-"""
+        )
+    
+    def _evaluate_and_plan(self, registry_results: List[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Core evaluation: assess current state, update plan, propose action.
+        
+        Args:
+            registry_results: Results from auto-executed registry discovery calls (if any)
+        """
+        logger.info("Starting evaluation and planning...")
+        
+        session = self.current_session
+        if not session:
+            logger.error("No active session for evaluation")
+            return {"goal_achieved": False, "error": "No session"}
+        
+        logger.info(f"Session: {session.id}, Turn: {session.budget.current_turn}")
+        self._apply_pending_summary()
+        tools_context = self._get_evaluation_tools_context()
+        
+        # Format session sections; each is re-rendered only when the session manager
+        # reports a change, so repeated evaluations within one turn reuse them
+        sm = self.session_manager
+        
+        # Format current plan
+        plan_str = self._cached_format(
+            "plan", sm.plan_version, lambda: self._format_plan(session.plan)
+        )
+        
+        # Format history
+        history_str = self._cached_format(
+            "history", sm.history_version,
+            lambda: self._format_history(session.history, session.history_summaries)
+        )
+        
+        # Include clarifications and rejections in context
+        clarifications_str = self._cached_format(
+            "clarifications", sm.clarifications_version,
+            lambda: self._format_clarifications(session.clarifications)
+        )
+        rejections_str = self._cached_format(
+            "rejections", sm.rejections_version,
+            lambda: self._format_rejections(session.rejections)
+        )
+        
+        # Format completed steps log (only grows alongside history)
+        completed_actions_str = self._cached_format(
+            "completed_actions", sm.history_version,
+            lambda: self._format_completed_actions(session.completed_actions)
+        )
+        
+        # Format registry discovery results (from auto-executed calls this turn)
+        registry_str = self._format_registry_results(registry_results or [])
+        
+        # Format two-tier tool cache
+        discovered_functions_str = self._format_discovered_functions()
+        cached_details_str = self._format_cached_function_details()
+        
+        system_prompt = self._build_system_prompt(
+            _EVALUATION_SYSTEM_PROMPT,
+            tools_context,
+            f"{discovered_functions_str}\n\n{cached_details_str}"
+        )
 
         user_message = f"""GOAL (your primary objective):
 {session.goal.original_text}
 
 CURRENT STATE:
 {session.state.summary}
-Completed: {json.dumps(session.state.completed_objectives)}
-Blockers: {json.dumps(session.state.blockers)}
+Completed: {compact_json(session.state.completed_objectives)}
+Blockers: {compact_json(session.state.blockers)}
 
 CURRENT PLAN:
 {plan_str}
@@ -675,68 +1071,25 @@ PREVIOUS CLARIFICATIONS (user answered questions):
 {clarifications_str}
 
 REJECTED ACTIONS (user rejected with feedback - DO NOT repeat these mistakes):
-{rejections_str}
-
-REGISTRY DISCOVERY RESULTS (from auto-executed calls this turn):
-{registry_str}
-
----
-
-Evaluate the situation and respond with JSON:
-{{
-    "goal_achieved": true/false,
-    "state_summary": "Updated understanding of the situation...",
-    "completed_objectives": ["objective 1", ...],
-    "blockers": ["any issues..."],
-    "plan_updates": {{
-        "add_steps": [{{"description": "...", "after_step_id": "..." or null}}],
-        "remove_step_ids": ["step_id", ...],
-        "update_steps": [{{"step_id": "...", "new_description": "..."}}]
-    }},
-    
-    // CHOOSE ONE: Either "next_actions" (1 or more) OR "clarification_questions" (1 or more)
-    
-    // Propose action(s):
-    "next_actions": [
-        {{
-            "plan_step_id": "which step this fulfills",
-            "tool_category": "category",
-            "tool_name": "function_name",
-            "parameters": {{...use EXACT parameter names from tool registry...}},
-            "reasoning": "why this specific action"
-        }}
-        // ... up to {MAX_BATCH_SIZE} actions total
-    ] or null,
-    "failure_strategy": "continue" or "stop_on_error",  // Required if next_actions.length > 1
-    
-    // OR ask for clarification:
-    "clarification_questions": [
-        {{
-            "question": "What specific information do you need?",
-            "context": "Why you need this information",
-            "options": ["Option A", "Option B"] or [],
-            "related_step_id": "step_id this relates to" or null
-        }}
-        // ... can ask multiple related questions
-    ] or null,
-    
-    "reasoning": "overall analysis..."
-}}
+{rejections_str}"""
 
-REMINDER: 
-- When specifying "parameters", use the EXACT parameter names shown in AVAILABLE TOOLS.
-- Always use "next_actions" array (even for single action). Include "failure_strategy" if len > 1.
-- If you need clarification, set "next_actions" to null and provide "clarification_questions" array.
-- If you have enough info to proceed, set "clarification_questions" to null and provide "next_actions".
-- Don't ask unnecessary questions - only ask when genuinely uncertain about something important.
-- You can ask multiple related questions at once if they're all needed.
-- If the user's answer to a previous clarification is itself a question or challenge, ask another clarification question to address their concern.
-- ALWAYS respond with valid JSON - never respond with plain text."""
+        # No cache breakpoint in the user turn: the state, plan and the system prompt's
+        # discovered-functions tail all change between evaluations, so it would never hit
+        user_content = [
+            {"type": "text", "text": user_message},
+            {
+                "type": "text",
+                "text": f"REGISTRY DISCOVERY RESULTS (from auto-executed calls this turn):\n{registry_str}"
+            },
+            {"type": "text", "text": f"---\n\n{_EVALUATION_RESPONSE_FORMAT}"},
+        ]
 
+        response = None
         try:
-            response, tokens, input_tokens = self._call_claude(system_prompt, user_message)
-            self.session_manager.add_tokens_used(tokens)
-            self.session_manager.update_context_tokens(input_tokens)
+            stats = self._call_claude(system_prompt, user_content, latency_sensitive=True)
+            self.session_manager.add_tokens_used(stats.total_tokens)
+            self.session_manager.update_context_tokens(stats.context_tokens)
+            response = stats.text
             logger.info("Evaluation response received")
             
             data = self._parse_json_response(response)
@@ -798,6 +1151,7 @@ REMINDER:
                 for step in self.current_session.plan.steps:
                     if step.id == step_id:
                         step.description = update.get("new_description", step.description)
+                        self.session_manager.mark_plan_changed()
                         break
         
         # Add steps
@@ -809,6 +1163,16 @@ REMINDER:
         
         self.session_manager.save_session()
     
+    def _cached_format(self, name: str, version: int, render: Callable[[], str]) -> str:
+        """Return the cached rendering of a prompt section, re-rendering on a version change."""
+        key = (self.current_session.id, version)
+        cached = self._format_cache.get(name)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        text = render()
+        self._format_cache[name] = (key, text)
+        return text
+    
     def _format_plan(self, plan: Plan) -> str:
         """Format plan for prompt."""
         if not plan.steps:
@@ -816,13 +1180,7 @@ REMINDER:
         
         lines = []
         for i, step in enumerate(plan.steps):
-            status_icon = {
-                StepStatus.PLANNED: "⬜",
-                StepStatus.IN_PROGRESS: "🔄",
-                StepStatus.COMPLETED: "✅",
-                StepStatus.FAILED: "❌",
-                StepStatus.SKIPPED: "⏭️"
-            }.get(step.status, "⬜")
+            status_icon = _STATUS_ICON.get(step.status, _STATUS_ICON[StepStatus.PLANNED])
             
             line = f"{i+1}. [{step.id}] {status_icon} {step.description}"
             if step.result:
@@ -850,12 +1208,9 @@ REMINDER:
         # Include recent history
         for entry in history[-MAX_EXECUTION_HISTORY_IN_CONTEXT:]:
             parts.append(f"Turn {entry.turn}: {entry.action.tool_category}/{entry.action.tool_name}")
-            parts.append(f"  Params: {json.dumps(entry.action.parameters)}")
+            parts.append(f"  Params: {entry.params_repr}")
             if entry.result.get("success"):
-                # Extract everything except "success" as the result
-                result_data = {k: v for k, v in entry.result.items() if k != "success"}
-                result_str = json.dumps(result_data)
-                parts.append(f"  Result: {result_str}")
+                parts.append(f"  Result: {entry.result_repr}")
             else:
                 parts.append(f"  Error: {entry.result.get('error', 'Unknown')}")
             parts.append("")
@@ -867,14 +1222,12 @@ REMINDER:
         if not clarifications:
             return "No previous clarifications."
         
+        # One template per entry; entries end in "\n" so the join leaves a blank line between them
         parts = []
         for entry in clarifications[-MAX_CLARIFICATIONS_IN_CONTEXT:]:
-            parts.append(f"Q (Turn {entry.turn}): {entry.question.question}")
-            if entry.question.options:
-                parts.append(f"  Options given: {entry.question.options}")
-            parts.append(f"A: {entry.answer.answer}")
-            parts.append("")
-        
+            options = entry.question.options
+            opts = f"  Options given: {options}\n" if options else ""
+            parts.append(f"Q (Turn {entry.turn}): {entry.question.question}\n{opts}A: {entry.answer.answer}\n")
         return "\n".join(parts)
     
     def _format_rejections(self, rejections: List[RejectionEntry]) -> str:
@@ -882,16 +1235,14 @@ REMINDER:
         if not rejections:
             return "No previous rejections."
         
-        parts = []
-        for entry in rejections[-3:]:  # Last 3 rejections
-            action = entry.rejection.rejected_action
-            parts.append(f"Turn {entry.turn}: User REJECTED action {action.tool_category}/{action.tool_name}")
-            parts.append(f"  User's feedback: {entry.rejection.feedback}")
-            parts.append("")
-        
-        return "\n".join(parts)
+        return "\n".join([
+            f"Turn {entry.turn}: User REJECTED action "
+            f"{entry.rejection.rejected_action.tool_category}/{entry.rejection.rejected_action.tool_name}\n"
+            f"  User's feedback: {entry.rejection.feedback}\n"
+            for entry in rejections[-3:]  # Last 3 rejections
+        ])
     
-    def _format_completed_actions(self, completed_actions: List['CompletedAction']) -> str:
+    def _format_completed_actions(self, completed_actions: List[CompletedAction]) -> str:
         """Format completed actions log for prompt."""
         if not completed_actions:
             return "No actions completed yet."
@@ -906,75 +1257,43 @@ REMINDER:
         return "\n".join(parts)
     
     def _format_registry_results(self, registry_results: List[Dict[str, Any]]) -> str:
-        """Format auto-executed registry discovery results for prompt."""
+        """
+        Format auto-executed registry discovery results for prompt.
+        
+        The list only grows within a turn, so lines for calls already formatted
+        are kept and only the new tail is formatted on re-evaluation.
+        """
         if not registry_results:
             return "No registry calls made this turn. Use registry tools to discover available functions."
         
-        parts = []
-        for i, call in enumerate(registry_results, 1):
-            tool = call.get("tool", "unknown")
-            params = call.get("params", {})
-            result = call.get("result", {})
-            
-            parts.append(f"Call #{i}: {tool}({json.dumps(params)})")
-            
-            if result.get("success"):
-                result_data = result.get("result", {})
-                
-                # Format search results more concisely
-                if tool == "registry_search" and "results" in result_data:
-                    functions = result_data.get("results", [])
-                    total = result_data.get("total", len(functions))
-                    parts.append(f"  Found {total} functions:")
-                    # Show up to 15 results with key info
-                    for func in functions[:15]:
-                        name = func.get("name", "?")
-                        desc = func.get("description", "")[:60]
-                        cat = func.get("category", "?")
-                        parts.append(f"    - {cat}/{name}: {desc}")
-                    if total > 15:
-                        parts.append(f"    ... and {total - 15} more")
-                
-                # Format category listing concisely
-                elif tool == "registry_list_category" and "functions" in result_data:
-                    functions = result_data.get("functions", [])
-                    total = result_data.get("total", len(functions))
-                    parts.append(f"  Category has {total} functions:")
-                    for func in functions[:15]:
-                        name = func.get("name", "?")
-                        desc = func.get("description", "")[:60]
-                        parts.append(f"    - {name}: {desc}")
-                    if total > 15:
-                        parts.append(f"    ... and {total - 15} more")
-                
-                # Format single function details fully (this is what agent needs)
-                elif tool == "registry_get_function":
-                    parts.append(f"  Function details:")
-                    parts.append(f"    Name: {result_data.get('name')}")
-                    parts.append(f"    Category: {result_data.get('category')}")
-                    parts.append(f"    Description: {result_data.get('description')}")
-                    params_info = result_data.get("parameters", {})
-                    if params_info:
-                        parts.append(f"    Parameters:")
-                        for pname, pinfo in params_info.items():
-                            ptype = pinfo.get("type", "any") if isinstance(pinfo, dict) else "any"
-                            required = pinfo.get("required", False) if isinstance(pinfo, dict) else False
-                            default = pinfo.get("default") if isinstance(pinfo, dict) else None
-                            req_str = " (REQUIRED)" if required else f" (optional, default={default})"
-                            parts.append(f"      - {pname}: {ptype}{req_str}")
-                
-                else:
-                    # Generic formatting for other results
-                    result_str = json.dumps(result_data, indent=2)
-                    if len(result_str) > 1000:
-                        result_str = result_str[:1000] + "\n... (truncated)"
-                    parts.append(f"  Result: {result_str}")
-            else:
-                parts.append(f"  Error: {result.get('error', 'Unknown error')}")
-            parts.append("")
+        cached = self._registry_fmt_cache
+        if cached is not None and cached[0] is registry_results and cached[1] <= len(registry_results):
+            _, done, parts = cached
+        else:
+            done, parts = 0, []
         
+        for i in range(done, len(registry_results)):
+            self._format_registry_call(i + 1, registry_results[i], parts)
+        
+        # Hold the list itself (not its id) so the identity check can't match a new list
+        self._registry_fmt_cache = (registry_results, len(registry_results), parts)
         return "\n".join(parts)
     
+    def _format_registry_call(self, i: int, call: Dict[str, Any], parts: List[str]) -> None:
+        """Append prompt lines for one registry discovery call (numbered from 1) to parts."""
+        tool = call.get("tool", "unknown")
+        params = call.get("params", {})
+        result = call.get("result", {})
+        
+        parts.append(f"Call #{i}: {tool}({compact_json(params)})")
+        
+        if result.get("success"):
+            formatter = _REGISTRY_FORMATTERS.get(tool, _fmt_registry_generic)
+            formatter(result.get("result", {}), parts)
+        else:
+            parts.append(f"  Error: {result.get('error', 'Unknown error')}")
+        parts.append("")
+    
     def _format_discovered_functions(self) -> str:
         """Format lightweight cache of discovered function names, grouped by category."""
         session = self.current_session
@@ -1102,38 +1421,31 @@ REMINDER:
         These tools help the agent discover available functions without loading all of them.
         Also populates the session's two-tier tool cache.
         """
-        logger.info(f"Executing registry meta-tool: {tool_name} with params: {parameters}")
+        result = self._fetch_registry_tool(tool_name, parameters)
+        self._record_registry_result(tool_name, parameters, result)
+        return result
+    
+    def _fetch_registry_tool(self, tool_name: str, parameters: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Run the registry request for a meta-tool without touching the tool cache.
+        Safe to call from worker threads: it only reads the session's cache;
+        _record_registry_result applies every cache update on the caller's thread.
+        """
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(f"Executing registry meta-tool: {tool_name} with params: {parameters}")
         session = self.current_session
         
         if tool_name == "registry_search":
             q = parameters.get("q", "")
             if not q:
                 return {"success": False, "error": "Missing required parameter 'q' for registry_search"}
-            result = self.tool_client.registry_search(q)
-            
-            # Cache discovered function names
-            if result.get("success") and "results" in result.get("result", {}):
-                for func in result["result"]["results"]:
-                    func_key = f"{func.get('category', 'unknown')}/{func.get('name', 'unknown')}"
-                    session.discovered_function_names.add(func_key)
-                logger.info(f"Added {len(result['result']['results'])} function names to discovery cache")
-            
-            return result
+            return self.tool_client.registry_search(q)
         
         elif tool_name == "registry_list_category":
             category = parameters.get("category", "")
             if not category:
                 return {"success": False, "error": "Missing required parameter 'category' for registry_list_category"}
-            result = self.tool_client.registry_list_category(category)
-            
-            # Cache discovered function names
-            if result.get("success") and "functions" in result.get("result", {}):
-                for func in result["result"]["functions"]:
-                    func_key = f"{category}/{func.get('name', 'unknown')}"
-                    session.discovered_function_names.add(func_key)
-                logger.info(f"Added {len(result['result']['functions'])} function names to discovery cache")
-            
-            return result
+            return self.tool_client.registry_list_category(category)
         
         elif tool_name == "registry_get_function":
             function_name = parameters.get("function_name", "")
@@ -1144,37 +1456,79 @@ REMINDER:
             for func_key, cached in session.cached_function_details.items():
                 if cached.name == function_name:
                     logger.info(f"Using cached function details for {function_name}")
-                    # Update last used turn for LRU
-                    cached.last_used_turn = session.budget.current_turn
-                    return {"success": True, "result": cached.details}
+                    # "cached" names the entry whose LRU turn _record_registry_result bumps
+                    return {"success": True, "result": cached.details, "cached": func_key}
             
             # Not in cache, fetch from registry
-            result = self.tool_client.registry_get_function(function_name)
-            
-            # Cache the details if successful
-            if result.get("success"):
-                details = result.get("result", {})
-                category = details.get("category", "unknown")
-                func_key = f"{category}/{function_name}"
-                
-                # Store in cache
-                session.cached_function_details[func_key] = CachedFunctionDetail(
-                    category=category,
-                    name=function_name,
-                    details=details,
-                    last_used_turn=session.budget.current_turn
-                )
-                
-                # Enforce LRU limit
-                self._enforce_function_cache_limit()
-                
-                logger.info(f"Cached function details for {func_key}")
-            
-            return result
+            return self.tool_client.registry_get_function(function_name)
         
         else:
             return {"success": False, "error": f"Unknown registry tool: {tool_name}"}
     
+    def _record_registry_result(
+        self,
+        tool_name: str,
+        parameters: Dict[str, Any],
+        result: Dict[str, Any]
+    ) -> None:
+        """Populate the session's two-tier tool cache from a registry meta-tool result."""
+        session = self.current_session
+        if not result.get("success"):
+            return
+        result_data = result.get("result", {})
+        
+        if tool_name == "registry_search":
+            # Cache discovered function names
+            if "results" in result_data:
+                functions = result_data["results"]
+                for func in functions:
+                    func_key = f"{func.get('category', 'unknown')}/{func.get('name', 'unknown')}"
+                    session.discovered_function_names.add(func_key)
+                logger.info(f"Added {len(functions)} function names to discovery cache")
+        
+        elif tool_name == "registry_list_category":
+            # Cache discovered function names
+            category = parameters.get("category", "")
+            self._mark_category_used(category)
+            if "functions" in result_data:
+                functions = result_data["functions"]
+                for func in functions:
+                    func_key = f"{category}/{func.get('name', 'unknown')}"
+                    session.discovered_function_names.add(func_key)
+                logger.info(f"Added {len(functions)} function names to discovery cache")
+        
+        elif tool_name == "registry_get_function":
+            # Served from the cache - only its last-used turn (for LRU) changes
+            cached_key = result.pop("cached", None)
+            if cached_key:
+                cached = session.cached_function_details.get(cached_key)
+                if cached:
+                    cached.last_used_turn = session.budget.current_turn
+                return
+            
+            # Cache the details
+            function_name = parameters.get("function_name", "")
+            details = result_data
+            category = details.get("category", "unknown")
+            func_key = f"{category}/{function_name}"
+            self._mark_category_used(details.get("category", ""))
+            # The registry knows a function our snapshot doesn't: it changed since the last refresh
+            if self._available_tools and (category, function_name) not in self._available_tools:
+                self.invalidate_tool_cache()
+            
+            # Store in cache
+            session.cached_function_details[func_key] = CachedFunctionDetail(
+                category=category,
+                name=function_name,
+                details=details,
+                last_used_turn=session.budget.current_turn
+            )
+            
+            # Enforce LRU limit
+            self._enforce_function_cache_limit()
+            
+            logger.info(f"Cached function details for {func_key}")
+    
     def _execute_single_action(self, action: Action) -> ExecutionResult:
         """
         Execute an approved action and update session state.
@@ -1203,6 +1557,7 @@ REMINDER:
             )
         
         logger.info(f"Executing validated tool: {action.tool_category}/{action.tool_name}")
+        self._mark_category_used(action.tool_category)
         
         # Mark the corresponding plan step as in progress
         if action.plan_step_id:
@@ -1214,6 +1569,7 @@ REMINDER:
             )
         
         # Handle registry meta-tools specially
+        result_tokens: Optional[int] = None  # None: estimate from the serialized result
         if action.tool_category == "registry":
             result = self._execute_registry_tool(action.tool_name, action.parameters)
         else:
@@ -1224,41 +1580,22 @@ REMINDER:
                 action.parameters
             )
             
-            # Update function cache after successful execution (non-registry tools)
-            if result.get("success"):
-                self._update_function_cache_after_use(action.tool_category, action.tool_name)
-        
-        # Update plan step status based on result
-        if action.plan_step_id:
-            if result.get("success"):
-                # Extract everything except the "success" field as the result
-                result_data = {k: v for k, v in result.items() if k != "success"}
-                result_str = json.dumps(result_data)
-                
-                self.session_manager.update_step_status(
-                    action.plan_step_id,
-                    StepStatus.COMPLETED,
-                    result=result_str
-                )
-            else:
-                self.session_manager.update_step_status(
-                    action.plan_step_id,
-                    StepStatus.FAILED,
-                    error=result.get("error", "Unknown error")
-                )
+            # Size the result from the raw response body instead of re-serializing it
+            raw_len = result.pop("_raw_len", None)
+            if raw_len is not None:
+                result_tokens = raw_len // TOKEN_ESTIMATION_DIVISOR
         
-        # Add to history
-        self.session_manager.add_history_entry(action, result)
+        success = result.get("success", False)
         
-        # Increment turn counter
-        self.session_manager.increment_turn()
+        # Update function cache after successful execution (non-registry tools)
+        if success and action.tool_category != "registry":
+            self._update_function_cache_after_use(action.tool_category, action.tool_name)
         
-        # Estimate tokens for the result (rough estimate)
-        result_tokens = len(json.dumps(result)) // TOKEN_ESTIMATION_DIVISOR
-        self.session_manager.add_tokens_used(result_tokens)
+        # History, step status, turn and token usage are persisted in one write
+        _, result_tokens = self.session_manager.commit_execution(action, result, result_tokens)
         
         return ExecutionResult(
-            success=result.get("success", False),
+            success=success,
             data=result,
             error=result.get("error"),
             tokens_used=result_tokens
@@ -1317,6 +1654,9 @@ REMINDER:
         
         logger.info(f"Batch complete: {len(results)} executed, {sum(1 for r in results if r.success)} succeeded")
         
+        # Get a summary going while the user reviews the results
+        self._summarize_history()
+        
         return BatchExecutionResult(
             results=results,
             overall_success=overall_success,
@@ -1327,13 +1667,14 @@ REMINDER:
     
     def skip_action(self, action: Action) -> None:
         """Mark the action's plan step as skipped."""
-        if action.plan_step_id:
-            self.session_manager.update_step_status(
-                action.plan_step_id,
-                StepStatus.SKIPPED
-            )
-        self.session_manager.add_agent_note(f"Action skipped: {action.tool_name}")
-        self.session_manager.increment_turn()
+        with self.session_manager.transaction():
+            if action.plan_step_id:
+                self.session_manager.update_step_status(
+                    action.plan_step_id,
+                    StepStatus.SKIPPED
+                )
+            self.session_manager.add_agent_note(f"Action skipped: {action.tool_name}")
+            self.session_manager.increment_turn()
     
     # ===================
     # Clarification Handling
@@ -1359,17 +1700,25 @@ REMINDER:
             answer=answer
         )
         
-        # Store in session
-        self.session_manager.add_clarification(question, clarification_answer)
-        
-        # Log it
         logger.info(f"Clarification received - Q: {question.question[:50]}... A: {answer[:50]}...")
-        self.session_manager.add_agent_note(
-            f"User clarification: '{question.question[:30]}...' -> '{answer[:50]}...'"
-        )
         
-        # Increment turn for the clarification exchange
-        self.session_manager.increment_turn()
+        with self.session_manager.transaction():
+            # Store in session
+            self.session_manager.add_clarification(question, clarification_answer)
+            self.session_manager.add_agent_note(
+                f"User clarification: '{question.question[:30]}...' -> '{answer[:50]}...'"
+            )
+            
+            # Increment turn for the clarification exchange
+            self.session_manager.increment_turn()
+    
+    def _next_local_id(self, prefix: str) -> str:
+        """
+        Cheap unique ID for records only referenced within their session
+        (wall-clock ns + a per-agent counter, no entropy read). Use
+        generate_id() for anything shared across processes.
+        """
+        return f"{prefix}-{time.time_ns():x}-{next(self._id_counter)}"
     
     def reject_action(self, action: Action, feedback: str) -> None:
         """
@@ -1383,38 +1732,58 @@ REMINDER:
         
         # Create rejection feedback object
         rejection = RejectionFeedback(
-            id=generate_id(),
+            id=self._next_local_id("rej"),
             rejected_action=action,
             feedback=feedback
         )
         
-        # Store in session
-        self.session_manager.add_rejection(rejection)
-        
-        # Mark the step as needing revision (back to planned)
-        if action.plan_step_id:
-            self.session_manager.update_step_status(
-                action.plan_step_id,
-                StepStatus.PLANNED  # Reset to planned so agent can retry
-            )
-        
-        # Log it
         logger.info(f"Action rejected - {action.tool_name}: {feedback[:50]}...")
-        self.session_manager.add_agent_note(
-            f"User rejected '{action.tool_name}': {feedback[:50]}..."
-        )
         
-        # Increment turn
-        self.session_manager.increment_turn()
+        with self.session_manager.transaction():
+            # Store in session
+            self.session_manager.add_rejection(rejection)
+            
+            # Mark the step as needing revision (back to planned)
+            if action.plan_step_id:
+                self.session_manager.update_step_status(
+                    action.plan_step_id,
+                    StepStatus.PLANNED  # Reset to planned so agent can retry
+                )
+            
+            self.session_manager.add_agent_note(
+                f"User rejected '{action.tool_name}': {feedback[:50]}..."
+            )
+            
+            # Increment turn
+            self.session_manager.increment_turn()
     
     # ===================
     # History Summarization
     # ===================
     
+    def _context_near_limit(self) -> bool:
+        """
+        Check whether the most recent prompt came close to the context window.
+        Uses the input token count reported by the last Claude call, so no
+        extra API request is needed.
+        """
+        session = self.current_session
+        if not session:
+            return False
+        return session.budget.current_context_tokens > CONTEXT_SUMMARIZE_THRESHOLD * CONTEXT_WINDOW_LIMIT
+    
     def _summarize_history(self) -> None:
-        """Summarize old history to manage context length."""
+        """
+        Start summarizing old history to manage context length.
+        
+        The Claude call runs on the shared I/O pool so it stays off the turn's
+        critical path; _apply_pending_summary folds the result into the session.
+        At most one summary is in flight at a time.
+        """
         session = self.current_session
-        if not session or len(session.history) < self.summarize_after:
+        if not session or self._pending_summary is not None:
+            return
+        if len(session.history) < self.summarize_after and not self._context_near_limit():
             return
         
         # Get entries to summarize (all but the last few)
@@ -1422,29 +1791,16 @@ REMINDER:
         if not entries_to_summarize:
             return
         
-        # Calculate the turn range for this summary
-        start_turn = entries_to_summarize[0].turn
-        end_turn = entries_to_summarize[-1].turn
-        
         # Format for summarization
-        history_text = []
-        for entry in entries_to_summarize:
-            history_text.append(
-                f"Turn {entry.turn}: {entry.action.tool_name} -> "
-                f"{'Success' if entry.result.get('success') else 'Failed'}"
-            )
+        history_text = "\n".join([
+            f"Turn {entry.turn}: {entry.action.tool_name} -> "
+            f"{'Success' if entry.result.get('success') else 'Failed'}"
+            for entry in entries_to_summarize
+        ])
         
-        system_prompt = """You are a summarization assistant. Summarize the execution history concisely.
-Focus on:
-1. What actions were taken
-2. Key results and outcomes
-3. Any failures or issues encountered
-
-Keep it brief but capture essential information for continuing the task."""
-
         user_message = f"""Summarize this execution history:
 
-{chr(10).join(history_text)}
+{history_text}
 
 Respond with JSON:
 {{
@@ -1452,27 +1808,58 @@ Respond with JSON:
     "key_results": ["result 1", "result 2", ...]
 }}"""
 
+        future = self._io_pool.submit(
+            self._call_claude, _SUMMARIZATION_SYSTEM_PROMPT, user_message, temperature=SUMMARIZATION_TEMPERATURE
+        )
+        self._pending_summary = (session.id, entries_to_summarize, future)
+    
+    def _apply_pending_summary(self, wait: bool = False) -> None:
+        """
+        Apply a finished background summary to the current session.
+        
+        Token accounting and session mutations happen here, on the caller's
+        thread. With wait=True, blocks until an in-flight summary completes.
+        """
+        if self._pending_summary is None:
+            return
+        session_id, entries, future = self._pending_summary
+        if not wait and not future.done():
+            return
+        self._pending_summary = None
+        
+        session = self.current_session
+        if not session or session.id != session_id:
+            return  # Started for a session that is no longer active
+        
         try:
-            response, tokens, input_tokens = self._call_claude(system_prompt, user_message, temperature=SUMMARIZATION_TEMPERATURE)
-            self.session_manager.add_tokens_used(tokens)
-            self.session_manager.update_context_tokens(input_tokens)
+            stats = future.result()
+            # Counts toward spend only: current_context_tokens tracks the main evaluation
+            # prompt, which _context_near_limit compares against the window
+            self.session_manager.add_tokens_used(stats.total_tokens)
             
-            data = self._parse_json_response(response)
+            data = self._parse_json_response(stats.text)
             
             summary = HistorySummary(
                 summary_text=data.get("summary", "Previous actions completed."),
-                turns_covered=len(entries_to_summarize),
-                start_turn=start_turn,
-                end_turn=end_turn,
+                turns_covered=len(entries),
+                start_turn=entries[0].turn,
+                end_turn=entries[-1].turn,
                 key_results=data.get("key_results", []),
-                created_at=datetime.now()
+                created_at=datetime.fromtimestamp(self._clock())
             )
             
+            # History may have grown while the summary was generated; drop exactly
+            # the summarized entries (still the oldest ones) and keep the rest
+            if len(session.history) < len(entries) or not all(
+                a is b for a, b in zip(session.history, entries)
+            ):
+                logger.warning("History changed during summarization, discarding summary")
+                return
             self.session_manager.add_history_summary(summary)
-            self.session_manager.clear_old_history(keep_recent=3)
+            self.session_manager.clear_old_history(keep_recent=len(session.history) - len(entries))
             
-        except Exception as e:
-            print(f"Error summarizing history: {e}")
+        except Exception:
+            logger.exception("Error summarizing history")
     
     # ===================
     # Utility Methods
@@ -1483,18 +1870,21 @@ Respond with JSON:
         if not action:
             return "No action proposed."
         
-        params_str = "\n".join([
-            f"  - {k}: {v}" for k, v in action.parameters.items()
-        ]) if action.parameters else "  None"
+        params = action.parameters
+        if not params:
+            params_str = "  None"
+        elif len(params) == 1:
+            (k, v), = params.items()
+            params_str = f"  - {k}: {v}"
+        else:
+            params_str = "\n".join([f"  - {k}: {v}" for k, v in params.items()])
         
-        return f"""🔧 **Proposed Action**
-
-**Tool:** {action.tool_category}/{action.tool_name}
-
-**Parameters:**
-{params_str}
-
-**Reasoning:** {action.reasoning}"""
+        return _EXPLAIN_TMPL(
+            category=action.tool_category,
+            name=action.tool_name,
+            params=params_str,
+            reasoning=action.reasoning,
+        )
     
     def abort_session(self) -> None:
         """Abort the current session."""
@@ -1506,13 +1896,23 @@ Respond with JSON:
         return self.session_manager.load_session(session_id)
 
 
+atexit.register(ContinuousPlanningAgent._io_pool.shutdown, wait=False)
+
+
 def create_agent(
     storage_dir: str = "./task_data",
-    tool_api_url: str = DEFAULT_TOOL_REGISTRY_URL
+    tool_api_url: str = DEFAULT_TOOL_REGISTRY_URL,
+    tool_client: Optional[ToolRegistryClient] = None
 ) -> ContinuousPlanningAgent:
-    """Factory function to create a fully configured agent."""
+    """
+    Factory function to create a fully configured agent.
+    
+    Pass tool_client to share one registry client (and its connection pool)
+    between agents; tool_api_url is only used when none is given.
+    """
     session_manager = SessionManager(storage_dir)
-    tool_client = ToolRegistryClient(tool_api_url)
+    if tool_client is None:
+        tool_client = ToolRegistryClient(tool_api_url)
     return ContinuousPlanningAgent(session_manager, tool_client)
 
 
@@ -4,19 +4,22 @@ Provides goal input, plan visualization, state tracking, and execution controls.
 """
 
 import streamlit as st
-import json
 import html
-from typing import Optional, Dict, Any, List
+from functools import lru_cache
+from typing import Optional, Dict, Any, List, Tuple, Callable
 
 from models import (
-    Session, StepStatus, PlanStep, Action, SessionStatus, Plan,
+    Session, Goal, AgentState, StepStatus, PlanStep, Action, SessionStatus, Plan,
     ClarificationQuestion, ClarificationAnswer, CompletedAction,
-    BatchAction, FailureStrategy, generate_id
+    BatchAction, FailureStrategy, TokenBudget, generate_id
 )
-from agent import ContinuousPlanningAgent, create_agent
+from agent import ContinuousPlanningAgent, create_agent, setup_logging
 from session_manager import SessionManager
 from tool_client import ToolRegistryClient
-from constant import CONTEXT_WINDOW_LIMIT
+from constant import CONTEXT_WINDOW_LIMIT, HEALTH_CHECK_TTL_SECONDS
+
+
+setup_logging()
 
 
 # Page configuration
@@ -28,7 +31,7 @@ st.set_page_config(
 )
 
 # Custom CSS
-st.markdown("""
+_CSS = """
 <style>
     /* Main container styling */
     .main-header {
@@ -111,12 +114,23 @@ st.markdown("""
         margin-bottom: 0.5rem;
         border-left: 4px solid #e2e8f0;
         transition: transform 0.2s, box-shadow 0.2s;
+        /* Skip layout/paint for steps scrolled out of the plan container */
+        content-visibility: auto;
+        contain-intrinsic-size: auto 60px;
     }
     
     .plan-step:hover {
         transform: translateX(4px);
         box-shadow: 0 2px 8px rgba(0,0,0,0.1);
     }
+    /* Long plans: no hover animation, so pointer moves don't restyle/repaint steps */
+    .plan-steps-container.many-steps .plan-step {
+        transition: none;
+    }
+    .plan-steps-container.many-steps .plan-step:hover {
+        transform: none;
+        box-shadow: none;
+    }
     
     .plan-step.completed {
         border-left-color: #10b981;
@@ -418,204 +432,972 @@ st.markdown("""
         margin-bottom: 1rem;
     }
 </style>
-""", unsafe_allow_html=True)
+"""
+
+
+# Initial Streamlit session state
+_DEFAULTS = {
+    "agent": None,
+    "current_session": None,
+    "turn_result": None,
+    "input_text": "",
+    "show_rejection_input": False,
+    "single_action_batch": None,  # Batch wrapper around the current single-action proposal
+}
 
 
 def init_session_state():
     """Initialize Streamlit session state variables."""
-    if "agent" not in st.session_state:
-        st.session_state.agent = None
-    if "current_session" not in st.session_state:
-        st.session_state.current_session = None
-    if "turn_result" not in st.session_state:
-        st.session_state.turn_result = None
-    if "input_text" not in st.session_state:
-        st.session_state.input_text = ""
-    if "show_rejection_input" not in st.session_state:
-        st.session_state.show_rejection_input = False
+    for key, value in _DEFAULTS.items():
+        st.session_state.setdefault(key, value)
+
+
+# Ended sessions (other than completed): (streamlit message function, text)
+_TERMINAL_MSGS = {
+    SessionStatus.BUDGET_EXCEEDED: ("error", "💸 Budget exceeded!"),
+    SessionStatus.ABORTED: ("warning", "🛑 Session aborted."),
+}
+
+
+def start_new_session(agent: ContinuousPlanningAgent):
+    """Drop the active session and return to the goal input."""
+    st.session_state.current_session = None
+    st.session_state.turn_result = None
+    st.session_state.input_text = ""
+    agent.session_manager.current_session = None
+    st.rerun()
+
+
+@st.cache_resource
+def get_tool_client() -> ToolRegistryClient:
+    """Shared registry client (keeps one HTTP connection pool across reruns)."""
+    return ToolRegistryClient()
+
+
+@st.cache_data(ttl=HEALTH_CHECK_TTL_SECONDS, show_spinner=False)
+def get_tool_health() -> Dict[str, Any]:
+    """Registry health, rechecked at most every HEALTH_CHECK_TTL_SECONDS."""
+    return get_tool_client().health_check()
+
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def saved_session_labels(_session_manager: SessionManager, storage_key: tuple) -> Dict[str, str]:
+    """
+    Selectbox labels of the saved sessions by id, newest first.
+    storage_key (directory + fingerprint) invalidates the cache, so the files
+    are only re-read and the labels re-formatted when a session is written.
+    """
+    return {
+        s["id"]: f"{s['id']} (Turn {s['turn']}) - {s['preview'][:25]}..."
+        for s in _session_manager.list_sessions()
+    }
 
 
 def get_agent() -> ContinuousPlanningAgent:
-    """Get or create the agent instance."""
+    """
+    Get or create this browser session's agent.
+    
+    The agent tracks the session being worked on, so it stays per user;
+    the registry client, Anthropic client and I/O pool behind it are shared.
+    """
     if st.session_state.agent is None:
-        st.session_state.agent = create_agent()
+        st.session_state.agent = create_agent(tool_client=get_tool_client())
     return st.session_state.agent
 
 
-def render_plan_step(step: PlanStep) -> str:
-    """Render a single plan step."""
-    import html
-    
-    status_class = {
-        StepStatus.COMPLETED: "completed",
-        StepStatus.IN_PROGRESS: "in-progress",
-        StepStatus.FAILED: "failed",
-        StepStatus.SKIPPED: "skipped",
-        StepStatus.PLANNED: ""
-    }.get(step.status, "")
-    
-    status_icon = {
-        StepStatus.COMPLETED: "✅",
-        StepStatus.IN_PROGRESS: "🔄",
-        StepStatus.FAILED: "❌",
-        StepStatus.SKIPPED: "⏭️",
-        StepStatus.PLANNED: "⬜"
-    }.get(step.status, "⬜")
+# Plan step CSS class and icon by status
+_STATUS_CLASS = {
+    StepStatus.COMPLETED: "completed",
+    StepStatus.IN_PROGRESS: "in-progress",
+    StepStatus.FAILED: "failed",
+    StepStatus.SKIPPED: "skipped",
+    StepStatus.PLANNED: ""
+}
+
+_STATUS_ICON = {
+    StepStatus.COMPLETED: "✅",
+    StepStatus.IN_PROGRESS: "🔄",
+    StepStatus.FAILED: "❌",
+    StepStatus.SKIPPED: "⏭️",
+    StepStatus.PLANNED: "⬜"
+}
+
+# Plans longer than this render without the step hover animation
+_ANIMATED_STEPS_LIMIT = 30
+
+# Opening markup of a plan step up to its description, per status
+_STEP_OPEN = {
+    status: f'<div class="plan-step {_STATUS_CLASS[status]}"><div class="step-description">{_STATUS_ICON[status]} '
+    for status in StepStatus
+}
+
+_NEXT_BADGE = '<div style="font-size: 0.75rem; color: #f59e0b; margin-top: 0.25rem;">⬅️ NEXT</div>'
+
+
+def render_plan_step(step: PlanStep, is_next: bool = False) -> str:
+    """Render a single plan step; is_next adds the "NEXT" indicator."""
+    return _plan_step_html_cache()(step.description, step.status, step.result, step.error, is_next)
+
+
+def render_plan_steps(steps: List[PlanStep]) -> str:
+    """Render all plan steps as one scrollable block, marking the next step."""
+    # Find current step index for "NEXT" indicator
+    current_idx = None
+    for i, step in enumerate(steps):
+        if step.status == StepStatus.IN_PROGRESS:
+            current_idx = i
+            break
+        elif step.status == StepStatus.PLANNED and current_idx is None:
+            # First planned step is next
+            current_idx = i
+    
+    # "NEXT" only marks a planned step (not one already in progress)
+    container_open = (
+        '<div class="plan-steps-container many-steps">' if len(steps) > _ANIMATED_STEPS_LIMIT
+        else '<div class="plan-steps-container">'
+    )
+    render_step = _plan_step_html_cache()
+    return container_open + "".join([
+        render_step(
+            step.description, step.status, step.result, step.error,
+            i == current_idx and step.status == StepStatus.PLANNED
+        )
+        for i, step in enumerate(steps)
+    ]) + '</div>'
+
+
+def _per_session_html(slot: str, key: tuple, build: Callable[[], Any]) -> Any:
+    """
+    Return the markup stored in st.session_state[slot], rebuilding it only when key changes.
     
+    Key components are compared with `is`, not `==`: a key holds the objects the
+    markup is built from, and is only valid for objects that are replaced rather
+    than mutated (SessionManager.update_state swaps in a new AgentState).
+    """
+    cached = st.session_state.get(slot)
+    if (cached is None or len(cached[0]) != len(key)
+            or any(old is not new for old, new in zip(cached[0], key))):
+        cached = (key, build())
+        st.session_state[slot] = cached
+    return cached[1]
+
+
+def render_goal_box(goal: Goal) -> str:
+    """Render the goal box."""
+    return f"""
+            <div class="goal-box">
+                <div class="goal-label">Your Objective</div>
+                <div class="goal-text">{html.escape(goal.original_text)}</div>
+            </div>
+            """
+
+
+def render_state(state: AgentState) -> Tuple[str, str, str]:
+    """Render the state card plus the completed-objectives and blockers markdown ("" when empty)."""
+    state_html = f"""
+            <div class="state-card">
+                <div class="state-label">Agent's Understanding</div>
+                <div class="state-content">{state.summary or "Analyzing..."}</div>
+            </div>
+            """
+    objectives_md = "**Completed:**\n" + "\n".join([
+        f"- ✅ {obj}" for obj in state.completed_objectives
+    ]) if state.completed_objectives else ""
+    blockers_md = "**Blockers:**\n" + "\n".join([
+        f"- ⚠️ {blocker}" for blocker in state.blockers
+    ]) if state.blockers else ""
+    return state_html, objectives_md, blockers_md
+
+
+@st.cache_resource
+def _plan_step_html_cache():
+    """
+    Process-wide LRU over _plan_step_html. This script's globals are rebuilt on
+    every rerun, so the memo lives in a cached resource; unchanged steps are
+    a lookup instead of a rebuild.
+    """
+    return lru_cache(maxsize=256)(_plan_step_html)
+
+
+def _plan_step_html(
+    description: str,
+    status: StepStatus,
+    result: Optional[str],
+    error: Optional[str],
+    is_next: bool
+) -> str:
+    """Plan step HTML from the fields it shows."""
     # HTML escape dynamic content to prevent breaking the HTML
-    escaped_description = html.escape(step.description)
+    escaped_description = html.escape(description)
     
     result_html = ""
-    if step.result:
-        result_preview = step.result[:100] + "..." if len(step.result) > 100 else step.result
+    if result:
+        result_preview = result[:100] + "..." if len(result) > 100 else result
         escaped_result = html.escape(result_preview)
         result_html = f'<div class="step-result">Result: {escaped_result}</div>'
-    elif step.error:
-        escaped_error = html.escape(step.error)
+    elif error:
+        escaped_error = html.escape(error)
         result_html = f'<div class="step-result" style="color: #dc2626;">Error: {escaped_error}</div>'
     
+    next_html = _NEXT_BADGE if is_next else ""
+    
     # Return HTML without extra indentation/whitespace
-    return f'<div class="plan-step {status_class}"><div class="step-description">{status_icon} {escaped_description}</div>{result_html}</div>'
+    return f'{_STEP_OPEN.get(status, _STEP_OPEN[StepStatus.PLANNED])}{escaped_description}</div>{result_html}{next_html}</div>'
+
+
+# Sidebar-style entry templates, compiled once at import
+_HISTORY_ENTRY_TMPL = (
+    '<div class="history-entry"><div class="history-turn">Turn {turn}</div>'
+    '<div class="history-action">{status} {category}/{name}</div></div>'
+).format
+
+_COMPLETED_ACTION_TMPL = """
+                    <div class="history-entry" style="border-left: 3px solid #10b981;">
+                        <div class="history-turn">Turn {turn}</div>
+                        <div style="color: #059669; font-weight: 600; margin-bottom: 0.25rem;">{tool_info}</div>
+                        <div style="color: #374151; font-size: 0.9rem;">{description}</div>
+                        <div style="color: #64748b; margin-top: 0.25rem; font-size: 0.875rem;">✓ {result_summary}</div>
+                    </div>
+                    """.format
+
+_CLARIFICATION_ENTRY_TMPL = """
+                    <div class="history-entry" style="border-left: 3px solid #8b5cf6;">
+                        <div class="history-turn">Turn {turn}</div>
+                        <div style="color: #5b21b6; font-weight: 500;">Q: {question}</div>
+                        <div style="color: #059669; margin-top: 0.25rem;">A: {answer}</div>
+                    </div>
+                    """.format
+
+_REJECTION_ENTRY_TMPL = """
+                    <div class="history-entry" style="border-left: 3px solid #f59e0b;">
+                        <div class="history-turn">Turn {turn}</div>
+                        <div style="color: #b45309; font-weight: 500;">Rejected: {category}/{name}</div>
+                        <div style="color: #1f2937; margin-top: 0.25rem;">Feedback: {feedback}</div>
+                    </div>
+                    """.format
+
+
+def _history_entry_html(turn: int, tool_category: str, tool_name: str, success: bool) -> str:
+    """Recent-history entry HTML."""
+    return _HISTORY_ENTRY_TMPL(
+        turn=turn,
+        status="✅" if success else "❌",
+        category=tool_category,
+        name=tool_name
+    )
+
+
+@st.cache_resource
+def _history_entry_html_cache():
+    """Process-wide LRU over _history_entry_html (see _plan_step_html_cache)."""
+    return lru_cache(maxsize=64)(_history_entry_html)
+
+
+def _completed_action_html(
+    turn: int,
+    tool_category: str,
+    tool_name: str,
+    description: str,
+    result_summary: str
+) -> str:
+    """Completed-action entry HTML."""
+    return _COMPLETED_ACTION_TMPL(
+        turn=turn,
+        tool_info=html.escape(f"{tool_category}/{tool_name}"),
+        description=html.escape(description),
+        result_summary=html.escape(result_summary)
+    )
+
+
+@st.cache_resource
+def _completed_action_html_cache():
+    """Process-wide LRU over _completed_action_html (see _plan_step_html_cache)."""
+    return lru_cache(maxsize=64)(_completed_action_html)
+
+
+def _preview(text: str, limit: int = 80) -> str:
+    """First `limit` characters of text, with "..." when cut."""
+    return text[:limit] + "..." if len(text) > limit else text
+
+
+def _clarification_entry_html(turn: int, question: str, answer: str) -> str:
+    """Clarification-history entry HTML."""
+    return _CLARIFICATION_ENTRY_TMPL(turn=turn, question=_preview(question), answer=_preview(answer))
+
+
+@st.cache_resource
+def _clarification_entry_html_cache():
+    """Process-wide LRU over _clarification_entry_html (see _plan_step_html_cache)."""
+    return lru_cache(maxsize=32)(_clarification_entry_html)
+
+
+def _rejection_entry_html(turn: int, tool_category: str, tool_name: str, feedback: str) -> str:
+    """Rejection-history entry HTML."""
+    return _REJECTION_ENTRY_TMPL(
+        turn=turn,
+        category=tool_category,
+        name=tool_name,
+        feedback=_preview(feedback)
+    )
+
+
+@st.cache_resource
+def _rejection_entry_html_cache():
+    """Process-wide LRU over _rejection_entry_html (see _plan_step_html_cache)."""
+    return lru_cache(maxsize=32)(_rejection_entry_html)
 
 
 def render_budget(session: Session) -> str:
     """Render the budget indicators."""
     budget = session.budget
-    
-    # Context window (fixed 200K limit)
-    context_pct = budget.context_percentage
-    context_class = "safe" if context_pct < 60 else ("warning" if context_pct < 85 else "danger")
-    
-    # Total token budget
-    token_pct = budget.token_percentage
-    token_class = "safe" if token_pct < 60 else ("warning" if token_pct < 85 else "danger")
-    
-    return f"""
+    return _render_budget_html_cache()(
+        budget.current_turn, budget.current_context_tokens, budget.used_tokens, budget.max_tokens
+    )
+
+
+def _usage_class(pct: float) -> str:
+    """Budget bar color class for a usage percentage."""
+    return "safe" if pct < 60 else ("warning" if pct < 85 else "danger")
+
+
+# Budget indicator markup, compiled once (fields: turn, context/used/max tokens, bar classes and widths)
+_BUDGET_TMPL = """
     <div class="budget-container">
         <div class="budget-text">
             <strong>💰 Budget</strong>
         </div>
         <div style="margin-top: 0.5rem;">
-            <div class="budget-text">Turns: {budget.current_turn}</div>
+            <div class="budget-text">Turns: {turn}</div>
         </div>
         <div style="margin-top: 0.5rem;">
-            <div class="budget-text">💬 Context: {budget.current_context_tokens:,} / {CONTEXT_WINDOW_LIMIT:,} tokens</div>
+            <div class="budget-text">💬 Context: {context_tokens:,} / {context_limit:,} tokens</div>
             <div class="budget-bar">
                 <div class="budget-fill {context_class}" style="width: {context_pct}%"></div>
             </div>
         </div>
         <div style="margin-top: 0.5rem;">
-            <div class="budget-text">💰 Total Used: {budget.used_tokens:,} / {budget.max_tokens:,} tokens</div>
+            <div class="budget-text">💰 Total Used: {used_tokens:,} / {max_tokens:,} tokens</div>
             <div class="budget-bar">
                 <div class="budget-fill {token_class}" style="width: {token_pct}%"></div>
             </div>
         </div>
     </div>
-    """
+    """.format
 
 
-def render_action_card(action: Action) -> str:
-    """Render the proposed action card."""
-    params_html = "<br>".join([
-        f"&nbsp;&nbsp;{k}: {json.dumps(v)}" for k, v in action.parameters.items()
-    ]) if action.parameters else "&nbsp;&nbsp;(none)"
+def _render_budget_html(current_turn: int, context_tokens: int, used_tokens: int, max_tokens: int) -> str:
+    """Budget indicator HTML from the budget counters."""
+    budget = TokenBudget(
+        max_tokens=max_tokens,
+        used_tokens=used_tokens,
+        current_context_tokens=context_tokens,
+        current_turn=current_turn
+    )
+    
+    # Context window (fixed 200K limit)
+    context_pct = budget.context_percentage
+    context_class = _usage_class(context_pct)
+    
+    # Total token budget
+    token_pct = budget.token_percentage
+    token_class = _usage_class(token_pct)
+    
+    return _BUDGET_TMPL(
+        turn=current_turn,
+        context_tokens=context_tokens,
+        context_limit=CONTEXT_WINDOW_LIMIT,
+        context_class=context_class,
+        context_pct=context_pct,
+        used_tokens=used_tokens,
+        max_tokens=max_tokens,
+        token_class=token_class,
+        token_pct=token_pct
+    )
+
+
+@st.cache_resource
+def _render_budget_html_cache():
+    """Process-wide LRU over _render_budget_html (see _plan_step_html_cache)."""
+    return lru_cache(maxsize=16)(_render_budget_html)
+
+
+def _plan_header_html(
+    confidence: float,
+    num_steps: int,
+    last_updated: str,
+    reasoning: str,
+    updated: bool
+) -> str:
+    """Plan header HTML from the plan's confidence, size, timestamp and reasoning."""
+    confidence_class = "high" if confidence >= 0.7 else ("medium" if confidence >= 0.4 else "low")
+    confidence_label = "High" if confidence >= 0.7 else ("Medium" if confidence >= 0.4 else "Low")
+    updated_badge = '<span class="plan-updated-badge">UPDATED</span>' if updated else ''
     
     return f"""
+    <div class="plan-header">
+        <div class="plan-title">
+            📋 Upcoming Tasks {updated_badge}
+            <span class="plan-confidence confidence-{confidence_class}">
+                {confidence_label} Confidence ({confidence:.0%})
+            </span>
+        </div>
+        <div class="plan-meta">
+            {num_steps} steps • Last updated: {last_updated}
+        </div>
+        {f'<div class="plan-reasoning">💭 {reasoning}</div>' if reasoning else ''}
+    </div>
+    """
+
+
+@st.cache_resource
+def _plan_header_html_cache():
+    """Process-wide LRU over _plan_header_html (see _plan_step_html_cache)."""
+    return lru_cache(maxsize=16)(_plan_header_html)
+
+
+def _plan_progress_html(completed: int, planned: int, failed: int, skipped: int, total: int) -> str:
+    """Plan progress bar HTML from the step counts."""
+    progress_pct = ((completed + skipped) / total * 100) if total > 0 else 0
+    failed_span = f'<span style="color: #dc2626;">❌ {failed} failed</span>' if failed > 0 else ''
+    return f"""<div style="margin-bottom: 1rem;">
+<div style="display: flex; justify-content: space-between; font-size: 0.8rem; color: #64748b; margin-bottom: 0.25rem;">
+<span>✅ {completed} completed</span>
+<span>⬜ {planned} remaining</span>
+{failed_span}
+</div>
+<div style="height: 6px; background: #e2e8f0; border-radius: 3px; overflow: hidden;">
+<div style="height: 100%; width: {progress_pct}%; background: linear-gradient(90deg, #10b981 0%, #059669 100%); border-radius: 3px;"></div>
+</div>
+</div>"""
+
+
+@st.cache_resource
+def _plan_progress_html_cache():
+    """Process-wide LRU over _plan_progress_html (see _plan_step_html_cache)."""
+    return lru_cache(maxsize=16)(_plan_progress_html)
+
+
+# Proposal card templates, compiled once at import
+_ACTION_CARD_TMPL = """
     <div class="action-card">
         <div class="action-label">🎬 Proposed Action</div>
         <div class="action-tool">
-            <strong>Tool:</strong> {action.tool_category}/{action.tool_name}<br>
-            <strong>Parameters:</strong><br>{params_html}
+            <strong>Tool:</strong> {category}/{name}
         </div>
         <div class="action-reasoning">
-            <strong>Reasoning:</strong> {action.reasoning}
+            <strong>Reasoning:</strong> {reasoning}
         </div>
     </div>
-    """
+    """.format
 
+_BATCH_ITEM_TMPL = (
+    '<div style="background: #f8fafc; border-left: 3px solid #3b82f6; padding: 0.75rem; margin-bottom: 0.5rem; border-radius: 0.375rem;">'
+    '<div style="font-weight: 600; color: #1e293b; margin-bottom: 0.25rem;">Action {index}/{total}</div>'
+    '<div style="color: #475569; font-size: 0.875rem;"><strong>Tool:</strong> {category}/{name}</div>'
+    '{reasoning}'
+    '</div>'
+).format
 
-def render_batch_card(batch: BatchAction) -> str:
-    """Render a batch of proposed actions."""
-    # Format strategy with explanation
-    strategy_icon = "🔄" if batch.failure_strategy == FailureStrategy.CONTINUE else "⏹️"
-    strategy_text = "Continue on error" if batch.failure_strategy == FailureStrategy.CONTINUE else "Stop on first error"
-    strategy_color = "#10b981" if batch.failure_strategy == FailureStrategy.CONTINUE else "#f59e0b"
-    
-    # Render each action in the batch
-    actions_html = []
-    for i, action in enumerate(batch.actions, 1):
-        params_html = "<br>".join([
-            f"&nbsp;&nbsp;&nbsp;&nbsp;{k}: {json.dumps(v)}" for k, v in action.parameters.items()
-        ]) if action.parameters else "&nbsp;&nbsp;&nbsp;&nbsp;(none)"
-        
-        actions_html.append(f'<div style="background: #f8fafc; border-left: 3px solid #3b82f6; padding: 0.75rem; margin-bottom: 0.5rem; border-radius: 0.375rem;">' +
-            f'<div style="font-weight: 600; color: #1e293b; margin-bottom: 0.25rem;">Action {i}/{len(batch.actions)}</div>' +
-            f'<div style="color: #475569; font-size: 0.875rem;"><strong>Tool:</strong> {action.tool_category}/{action.tool_name}<br><strong>Parameters:</strong><br>{params_html}</div>' +
-            (f'<div style="color: #64748b; font-size: 0.8125rem; margin-top: 0.25rem; font-style: italic;">{action.reasoning}</div>' if action.reasoning else '') +
-            '</div>')
-    
-    return f"""
+_BATCH_ITEM_REASONING_TMPL = '<div style="color: #64748b; font-size: 0.8125rem; margin-top: 0.25rem; font-style: italic;">{}</div>'.format
+
+_BATCH_CARD_TMPL = """
     <div class="action-card" style="border-left: 4px solid #8b5cf6;">
-        <div class="action-label">🎬 Proposed Batch Actions ({len(batch.actions)} actions)</div>
-        <div style="background: {strategy_color}15; border-radius: 0.375rem; padding: 0.5rem; margin-bottom: 0.75rem;">
-            <div style="color: {strategy_color}; font-weight: 500; font-size: 0.875rem;">
-                {strategy_icon} Strategy: {strategy_text}
+        <div class="action-label">🎬 Proposed Batch Actions ({total} actions)</div>
+        <div style="background: {color}15; border-radius: 0.375rem; padding: 0.5rem; margin-bottom: 0.75rem;">
+            <div style="color: {color}; font-weight: 500; font-size: 0.875rem;">
+                {icon} Strategy: {strategy}
             </div>
         </div>
         <div class="action-reasoning" style="margin-bottom: 0.75rem;">
-            <strong>Batch Reasoning:</strong> {batch.reasoning}
+            <strong>Batch Reasoning:</strong> {reasoning}
         </div>
         <div style="max-height: 400px; overflow-y: auto;">
-            {''.join(actions_html)}
+            {actions}
         </div>
     </div>
-    """
+    """.format
+
+
+def render_action_card(action: Action) -> str:
+    """Render the proposed action card (parameters are shown by show_proposal)."""
+    return _ACTION_CARD_TMPL(
+        category=action.tool_category,
+        name=action.tool_name,
+        reasoning=action.reasoning
+    )
+
+
+def render_batch_card(batch: BatchAction) -> str:
+    """Render a batch of proposed actions."""
+    # Format strategy with explanation
+    strategy_icon = "🔄" if batch.failure_strategy == FailureStrategy.CONTINUE else "⏹️"
+    strategy_text = "Continue on error" if batch.failure_strategy == FailureStrategy.CONTINUE else "Stop on first error"
+    strategy_color = "#10b981" if batch.failure_strategy == FailureStrategy.CONTINUE else "#f59e0b"
+    
+    # Render each action in the batch (parameters are shown by show_proposal)
+    total = len(batch.actions)
+    actions_html = "".join([
+        _BATCH_ITEM_TMPL(
+            index=i,
+            total=total,
+            category=action.tool_category,
+            name=action.tool_name,
+            reasoning=_BATCH_ITEM_REASONING_TMPL(action.reasoning) if action.reasoning else ''
+        )
+        for i, action in enumerate(batch.actions, 1)
+    ])
+    
+    return _BATCH_CARD_TMPL(
+        total=total,
+        color=strategy_color,
+        icon=strategy_icon,
+        strategy=strategy_text,
+        reasoning=batch.reasoning,
+        actions=actions_html
+    )
+
+
+def show_proposal(batch: BatchAction, action: Optional[Action], is_batch: bool):
+    """Show the proposed action or batch card followed by its parameters in a JSON view."""
+    if is_batch:
+        st.html(render_batch_card(batch))
+        # Actions open, parameter objects collapsed: bounded size however large the batch
+        st.json({
+            f"Action {i}: {act.tool_category}/{act.tool_name}": act.parameters
+            for i, act in enumerate(batch.actions, 1)
+        }, expanded=1)
+    else:
+        st.html(render_action_card(action))
+        if action.parameters:
+            st.json(action.parameters)
+        else:
+            st.caption("No parameters")
+
+
+def show_objectives(heading: str, objectives: List[str], limit: int = 8):
+    """Show the first `limit` completed objectives under a heading, with a count of the rest."""
+    if not objectives:
+        return
+    st.markdown(heading)
+    st.markdown("\n\n".join([f"✓ {obj}" for obj in objectives[:limit]]))
+    extra = len(objectives) - limit
+    if extra > 0:
+        st.caption(f"...and {extra} more")
+
+
+# Clarification card templates, compiled once at import
+_CLARIFICATION_CARD_TMPL = '<div class="clarification-card"><div class="clarification-label">❓ Clarification Needed</div><div class="clarification-question">{question}</div>{context}{options}</div>'.format
+_CLARIFICATION_CONTEXT_TMPL = '<div class="clarification-context"><strong>Why I\'m asking:</strong> {}</div>'.format
+_CLARIFICATION_OPTIONS_TMPL = '<div class="clarification-options"><strong>Suggested options:</strong><br>{}</div>'.format
+_CLARIFICATION_OPTION_TMPL = '<span class="clarification-option">{}</span>'.format
 
 
 def render_clarification_card(question: ClarificationQuestion) -> str:
     """Render the clarification question card."""
     options_html = ""
     if question.options:
-        options_items = "".join([
-            f'<span class="clarification-option">{opt}</span>' for opt in question.options
-        ])
-        options_html = f'<div class="clarification-options"><strong>Suggested options:</strong><br>{options_items}</div>'
+        options_html = _CLARIFICATION_OPTIONS_TMPL("".join(map(_CLARIFICATION_OPTION_TMPL, question.options)))
     
-    context_html = ""
-    if question.context:
-        context_html = f'<div class="clarification-context"><strong>Why I\'m asking:</strong> {question.context}</div>'
+    context_html = _CLARIFICATION_CONTEXT_TMPL(question.context) if question.context else ""
     
-    return f'<div class="clarification-card"><div class="clarification-label">❓ Clarification Needed</div><div class="clarification-question">{question.question}</div>{context_html}{options_html}</div>'
+    return _CLARIFICATION_CARD_TMPL(
+        question=question.question,
+        context=context_html,
+        options=options_html
+    )
+
+
+@st.fragment
+def render_turn_controls(agent: ContinuousPlanningAgent, session: Session):
+    """
+    Turn controls: run the next turn, review a proposal, answer a question.
+    
+    Runs as a fragment so typing feedback or toggling an input only reruns this
+    panel; anything that changes the session still reruns the whole app.
+    """
+    # Get or show turn result
+    turn_result = st.session_state.turn_result
+    
+    if turn_result is None:
+        # Run a turn to get proposed action
+        if st.button("▶️ Next Turn", type="primary", use_container_width=True, key="execute_next_turn"):
+            with st.spinner("Evaluating and planning..."):
+                turn_result = agent.run_turn()
+                st.session_state.turn_result = turn_result
+                st.session_state.current_session = agent.current_session
+            st.rerun()
+    
+    else:
+        # Show turn result
+        # Defensive check for turn_result validity
+        if not hasattr(turn_result, 'status') or turn_result.status is None:
+            st.error("⚠️ Invalid turn result - clearing and retrying")
+            st.session_state.turn_result = None
+            st.rerun()
+        
+        elif turn_result.status == "completed":
+            # Agent believes goal is achieved - ask user to confirm
+            
+            # Show agent's reasoning
+            st.html(f"""
+            <div class="state-card" style="border-left: 4px solid #10b981;">
+                <div class="state-label">✅ Agent Assessment (Turn {session.budget.current_turn})</div>
+                <div class="state-content">{turn_result.reasoning}</div>
+            </div>
+            """)
+            
+            # Show what was completed
+            show_objectives("### 🎯 Completed Objectives", session.state.completed_objectives)
+            
+            st.markdown("<br>", unsafe_allow_html=True)
+            
+            # Confirmation prompt
+            st.html("""
+            <div style="background: #fef3c7; 
+                        border-left: 4px solid #f59e0b; 
+                        padding: 1.25rem; 
+                        border-radius: 0.5rem; 
+                        margin-bottom: 1rem;">
+                <div style="color: #92400e; font-weight: 600; font-size: 1.1rem; margin-bottom: 0.5rem;">
+                    🤔 Do you agree the goal is achieved?
+                </div>
+                <div style="color: #78350f; font-size: 0.95rem;">
+                    The agent believes all objectives have been completed. Please confirm or provide feedback if more work is needed.
+                </div>
+            </div>
+            """)
+            
+            # Check if we're showing feedback input
+            if st.session_state.get('show_completion_feedback', False):
+                st.markdown("**✏️ What else needs to be done?**")
+                # In a form, typing doesn't rerun anything until a button is pressed
+                with st.form("completion_feedback_form", border=False):
+                    completion_feedback = st.text_area(
+                        "Please describe what's missing or what should be done differently:",
+                        key="completion_feedback",
+                        placeholder="e.g., 'We still need to test the deployment' or 'The email template needs revision'",
+                        height=120
+                    )
+                    
+                    col_submit_fb, col_cancel_fb = st.columns(2)
+                    with col_submit_fb:
+                        submit_fb = st.form_submit_button("📤 Submit Feedback", type="primary", use_container_width=True)
+                    with col_cancel_fb:
+                        cancel_fb = st.form_submit_button("❌ Cancel", use_container_width=True)
+                
+                if submit_fb:
+                    if completion_feedback:
+                        # Add feedback as a clarification answer saying goal NOT complete
+                        feedback_question = ClarificationQuestion(
+                            id=generate_id(),
+                            question="Is the goal achieved?",
+                            context="Agent believes goal is complete but needs user confirmation",
+                            options=[]
+                        )
+                        agent.provide_clarification(feedback_question, f"No, not yet. {completion_feedback}")
+                        
+                        st.session_state.turn_result = None
+                        st.session_state.current_session = agent.current_session
+                        st.session_state.show_completion_feedback = False
+                        st.toast("Feedback submitted! Agent will continue...", icon="🔄")
+                        st.rerun()
+                    else:
+                        st.warning("Please describe what still needs to be done.")
+                
+                if cancel_fb:
+                    st.session_state.show_completion_feedback = False
+                    st.rerun(scope="fragment")
+            
+            else:
+                # Show confirmation buttons
+                col_yes, col_no = st.columns(2)
+                
+                with col_yes:
+                    if st.button("✅ Yes, Goal Achieved!", type="primary", use_container_width=True, key="confirm_goal_achieved"):
+                        # Mark session as completed and show celebration
+                        agent.session_manager.complete_session()
+                        st.session_state.turn_result = None
+                        st.session_state.current_session = agent.current_session
+                        st.rerun()
+                
+                with col_no:
+                    if st.button("✏️ No, Provide Feedback", use_container_width=True, key="provide_completion_feedback"):
+                        st.session_state.show_completion_feedback = True
+                        st.rerun(scope="fragment")
+        
+        elif turn_result.status == "awaiting_approval":
+            # Check if this is a batch or single action
+            is_batch = turn_result.proposed_batch is not None
+            action = turn_result.proposed_action
+            
+            # Normalize to always have a batch (for unified execution API)
+            if is_batch:
+                batch = turn_result.proposed_batch
+            else:
+                # Create a single-action batch for unified API, once per proposed action
+                batch = st.session_state.single_action_batch
+                if batch is None or batch.actions[0] is not action:
+                    batch = BatchAction(
+                        id=generate_id(),
+                        actions=[action],
+                        failure_strategy=FailureStrategy.STOP_ON_ERROR,
+                        reasoning=""
+                    )
+                    st.session_state.single_action_batch = batch
+            
+            # Show agent's overall reasoning for this turn
+            if turn_result.reasoning:
+                st.html(f"""
+                <div class="state-card" style="border-left: 4px solid #6366f1;">
+                    <div class="state-label">🧠 Agent's Analysis (Turn {session.budget.current_turn})</div>
+                    <div class="state-content">{turn_result.reasoning}</div>
+                </div>
+                """)
+            
+            # Display batch or single action (in a slot so approval can clear it in place)
+            card_slot = st.empty()
+            with card_slot.container():
+                show_proposal(batch, action, is_batch)
+            
+            # Check if we're in rejection mode
+            if st.session_state.get('show_rejection_input', False):
+                # Show rejection feedback input
+                st.markdown("---")
+                st.markdown("**✏️ Provide feedback for the agent:**")
+                with st.form("rejection_feedback_form", border=False):
+                    rejection_feedback = st.text_area(
+                        "What should the agent do instead?",
+                        key="rejection_feedback",
+                        placeholder="e.g., 'Use email instead of Slack' or 'The parameters are wrong - use X instead of Y'",
+                        height=100
+                    )
+                    
+                    col_submit_rej, col_cancel_rej = st.columns(2)
+                    with col_submit_rej:
+                        submit_rej = st.form_submit_button("📤 Submit Feedback", type="primary", use_container_width=True)
+                    with col_cancel_rej:
+                        cancel_rej = st.form_submit_button("❌ Cancel", use_container_width=True)
+                
+                if submit_rej:
+                    if rejection_feedback:
+                        # Handle batch vs single action rejection
+                        if is_batch:
+                            # For batches, skip all actions and provide feedback as clarification
+                            for act in batch.actions:
+                                agent.skip_action(act)
+                            # Provide feedback as a clarification to guide next steps
+                            feedback_question = ClarificationQuestion(
+                                id=generate_id(),
+                                question="How should I adjust the proposed batch?",
+                                context=f"User rejected batch of {len(batch.actions)} actions",
+                                options=[]
+                            )
+                            agent.provide_clarification(feedback_question, rejection_feedback)
+                        else:
+                            # Single action - use reject_action
+                            agent.reject_action(action, rejection_feedback)
+                        
+                        st.session_state.turn_result = None
+                        st.session_state.current_session = agent.current_session
+                        st.session_state.show_rejection_input = False
+                        st.toast("Feedback submitted! Agent will adjust...", icon="✏️")
+                        st.rerun()
+                    else:
+                        st.warning("Please tell the agent what to do instead.")
+                
+                if cancel_rej:
+                    st.session_state.show_rejection_input = False
+                    st.rerun(scope="fragment")
+            else:
+                # Show normal action buttons
+                col_approve, col_reject, col_skip, col_abort = st.columns(4)
+                
+                with col_approve:
+                    if st.button("✅ Approve", type="primary", use_container_width=True, key="approve_action"):
+                        # Don't leave the approved proposal on screen while it runs
+                        card_slot.empty()
+                        with st.spinner("Executing..."):
+                            # Always use execute_batch (handles both single and multiple actions)
+                            batch_result = agent.execute_batch(batch)
+                            success_msg = f"{batch_result.success_count}/{len(batch_result.results)} succeeded"
+                            if batch_result.overall_success:
+                                st.toast(f"Batch completed! {success_msg}", icon="✅")
+                            else:
+                                st.toast(f"Batch partial success: {success_msg}", icon="⚠️")
+                        
+                        st.session_state.turn_result = None
+                        st.session_state.current_session = agent.current_session
+                        st.rerun()
+                
+                with col_reject:
+                    if st.button("✏️ Reject with Feedback", use_container_width=True, key="show_rejection_input"):
+                        st.session_state.show_rejection_input = True
+                        st.rerun(scope="fragment")
+                
+                with col_skip:
+                    if st.button("⏭️ Skip", use_container_width=True, key="skip_action"):
+                        # Handle batch vs single action skip
+                        if is_batch:
+                            # Skip all actions in batch
+                            for act in batch.actions:
+                                agent.skip_action(act)
+                        else:
+                            agent.skip_action(action)
+                        st.session_state.turn_result = None
+                        st.session_state.current_session = agent.current_session
+                        st.rerun()
+                
+                with col_abort:
+                    if st.button("🛑 Abort", use_container_width=True, key="abort_session"):
+                        agent.abort_session()
+                        st.session_state.turn_result = None
+                        st.session_state.current_session = agent.current_session
+                        st.rerun()
+        
+        elif turn_result.status == "needs_clarification":
+            question = turn_result.clarification_question
+            
+            # Show agent's reasoning
+            if turn_result.reasoning:
+                st.html(f"""
+                <div class="state-card" style="border-left: 4px solid #8b5cf6;">
+                    <div class="state-label">🧠 Agent's Analysis (Turn {session.budget.current_turn})</div>
+                    <div class="state-content">{turn_result.reasoning}</div>
+                </div>
+                """)
+            
+            # Show clarification card
+            st.html(render_clarification_card(question))
+            
+            # Answer input (in a form: choosing and typing only take effect on submit)
+            with st.form("clarification_form", border=False):
+                if question.options:
+                    # If options provided, show as radio buttons
+                    selected_option = st.radio(
+                        "Select your answer:",
+                        options=question.options + ["Other (type below)"],
+                        key="clarification_radio"
+                    )
+                    
+                    # Always show text input: the answer for "Other", extra details otherwise
+                    text_input = st.text_input(
+                        "Your answer or additional details:",
+                        key="clarification_text_with_options",
+                        placeholder="Type your answer, or add details for the selected option..."
+                    )
+                    
+                    # Combine selection with text if provided
+                    if selected_option == "Other (type below)":
+                        answer = text_input
+                    else:
+                        # If text is provided, combine it with the selected option
+                        answer = f"{selected_option}\n{text_input}" if text_input else selected_option
+                else:
+                    # Free text input
+                    answer = st.text_area(
+                        "Your answer:",
+                        key="clarification_text",
+                        placeholder="Type your answer...",
+                        height=100
+                    )
+                
+                submitted = st.form_submit_button("📤 Submit Answer", type="primary", use_container_width=True)
+            
+            if submitted:
+                if answer:
+                    agent.provide_clarification(question, answer)
+                    st.session_state.turn_result = None
+                    st.session_state.current_session = agent.current_session
+                    st.toast("Answer submitted! Agent will continue...", icon="✅")
+                    st.rerun()
+                else:
+                    st.warning("Please type an answer, or skip the question.")
+            
+            col_skip_q, col_abort_q = st.columns(2)
+            
+            with col_skip_q:
+                if st.button("⏭️ Skip Question", use_container_width=True):
+                    # Submit "No answer provided" and continue
+                    agent.provide_clarification(question, "[User skipped this question]")
+                    st.session_state.turn_result = None
+                    st.session_state.current_session = agent.current_session
+                    st.rerun()
+            
+            with col_abort_q:
+                if st.button("🛑 Abort Session", use_container_width=True):
+                    agent.abort_session()
+                    st.session_state.turn_result = None
+                    st.session_state.current_session = agent.current_session
+                    st.rerun()
+        
+        elif turn_result.status == "no_action":
+            st.warning("No action available")
+            st.markdown(f"**Reasoning:** {turn_result.reasoning}")
+            if turn_result.error:
+                st.error(f"**Issue:** {turn_result.error}")
+            
+            if st.button("🔄 Try Again"):
+                st.session_state.turn_result = None
+                st.rerun()
+        
+        elif turn_result.status == "budget_exceeded":
+            st.error("💸 Budget exceeded!")
+            st.session_state.turn_result = None
+            st.session_state.current_session = agent.current_session
+            st.rerun()
+        
+        elif turn_result.status == "error":
+            st.error("❌ Agent Error")
+            st.markdown(f"**Reasoning:** {turn_result.reasoning}")
+            if turn_result.error:
+                st.code(turn_result.error, language=None)
+            
+            col_retry, col_abort_err = st.columns(2)
+            with col_retry:
+                if st.button("🔄 Try Again", type="primary", use_container_width=True, key="retry_after_error"):
+                    st.session_state.turn_result = None
+                    st.rerun()
+            with col_abort_err:
+                if st.button("🛑 Abort Session", use_container_width=True, key="abort_after_error"):
+                    agent.abort_session()
+                    st.session_state.turn_result = None
+                    st.session_state.current_session = agent.current_session
+                    st.rerun()
+        
+        else:
+            # Unexpected status - clear and retry
+            st.error(f"⚠️ Unexpected turn status: {turn_result.status}")
+            st.markdown(f"**Reasoning:** {turn_result.reasoning if hasattr(turn_result, 'reasoning') else 'N/A'}")
+            if st.button("🔄 Clear and Retry", key="clear_unexpected_status"):
+                st.session_state.turn_result = None
+                st.rerun()
 
 
 def main():
     """Main application entry point."""
     init_session_state()
     
+    # Streamlit drops elements a rerun doesn't emit, so the styles go out every run;
+    # st.html skips the Markdown parse and, being style-only, takes no layout space
+    st.html(_CSS)
+    
     # Header
-    st.markdown('<div class="main-header">🤖 Smart Agent</div>', unsafe_allow_html=True)
-    st.markdown('<div class="sub-header">Adaptive planning with step-by-step execution</div>', unsafe_allow_html=True)
+    st.html('<div class="main-header">🤖 Smart Agent</div>')
+    st.html('<div class="sub-header">Adaptive planning with step-by-step execution</div>')
     
     # Sidebar
     with st.sidebar:
         st.markdown("### ⚙️ Settings")
         
         # Tool API Status
-        tool_client = ToolRegistryClient()
-        health = tool_client.health_check()
+        health = get_tool_health()
         
         if health["status"] == "healthy":
-            st.markdown(
-                '<div class="health-indicator health-healthy">🟢 Tool API Connected</div>',
-                unsafe_allow_html=True
-            )
+            st.html('<div class="health-indicator health-healthy">🟢 Tool API Connected</div>')
             if "info" in health:
                 st.caption(f"Functions: {health['info'].get('total_functions', 'N/A')}")
         else:
-            st.markdown(
-                '<div class="health-indicator health-unhealthy">🔴 Tool API Offline</div>',
-                unsafe_allow_html=True
-            )
+            st.html('<div class="health-indicator health-unhealthy">🔴 Tool API Offline</div>')
             st.error(f"Error: {health.get('error', 'Unknown')}")
         
         st.divider()
@@ -624,13 +1406,10 @@ def main():
         st.markdown("### 📁 Sessions")
         
         agent = get_agent()
-        sessions = agent.session_manager.list_sessions()
+        sm = agent.session_manager
+        session_options = saved_session_labels(sm, (str(sm.storage_dir), *sm.storage_fingerprint()))
         
-        if sessions:
-            session_options = {
-                s["id"]: f"{s['id']} (Turn {s['turn']}) - {s['preview'][:25]}..."
-                for s in sessions
-            }
+        if session_options:
             selected_session = st.selectbox(
                 "Load existing session",
                 options=[""] + list(session_options.keys()),
@@ -692,43 +1471,34 @@ def main():
         with col1:
             # Goal section
             st.markdown("### 🎯 Goal")
-            st.markdown(f"""
-            <div class="goal-box">
-                <div class="goal-label">Your Objective</div>
-                <div class="goal-text">{html.escape(session.goal.original_text)}</div>
-            </div>
-            """, unsafe_allow_html=True)
+            # The goal never changes within a session, so it is escaped once per session
+            st.html(_per_session_html("_goal_html", (session.goal,), lambda: render_goal_box(session.goal)))
             
-            # State section
+            # State section (the agent replaces session.state wholesale each evaluation)
             st.markdown("### 📊 Current State")
-            st.markdown(f"""
-            <div class="state-card">
-                <div class="state-label">Agent's Understanding</div>
-                <div class="state-content">{session.state.summary or "Analyzing..."}</div>
-            </div>
-            """, unsafe_allow_html=True)
+            state_html, objectives_md, blockers_md = _per_session_html(
+                "_state_html", (session.state,), lambda: render_state(session.state)
+            )
+            st.html(state_html)
             
-            if session.state.completed_objectives:
-                st.markdown("**Completed:**")
-                for obj in session.state.completed_objectives:
-                    st.markdown(f"- ✅ {obj}")
+            # One element per list rather than one per bullet
+            if objectives_md:
+                st.markdown(objectives_md)
             
-            if session.state.blockers:
-                st.markdown("**Blockers:**")
-                for blocker in session.state.blockers:
-                    st.markdown(f"- ⚠️ {blocker}")
+            if blockers_md:
+                st.markdown(blockers_md)
             
             # Budget
-            st.markdown(render_budget(session), unsafe_allow_html=True)
+            st.html(render_budget(session))
         
         with col2:
             # Execution section with turn counter (at top for easy access)
-            st.markdown(f"""
+            st.html(f"""
             <div style="display: flex; justify-content: space-between; align-items: center; margin-bottom: 1rem;">
                 <h3 style="margin: 0;">🎮 Execution</h3>
                 <span style="color: #64748b; font-size: 1.3rem; font-weight: 600;">Turn {session.budget.current_turn}</span>
             </div>
-            """, unsafe_allow_html=True)
+            """)
             
             # Check session status
             if session.status == SessionStatus.COMPLETED:
@@ -736,7 +1506,7 @@ def main():
                 st.balloons()
                 
                 # Prominent success card
-                st.markdown(f"""
+                st.html(f"""
                 <div style="background: linear-gradient(135deg, #10b981 0%, #059669 100%); 
                             color: white; 
                             padding: 2rem; 
@@ -751,7 +1521,7 @@ def main():
                         Mission accomplished in {session.budget.current_turn} turns
                     </div>
                 </div>
-                """, unsafe_allow_html=True)
+                """)
                 
                 # Show summary stats
                 completed_count = len(session.completed_actions)
@@ -766,459 +1536,48 @@ def main():
                     st.metric("💬 Tokens", f"{token_pct:.0f}%")
                 
                 # Show completed objectives
-                if session.state.completed_objectives:
-                    st.markdown("### 🎯 What We Accomplished")
-                    for obj in session.state.completed_objectives[:8]:  # Show first 8
-                        st.markdown(f"✓ {obj}")
-                    if len(session.state.completed_objectives) > 8:
-                        st.caption(f"...and {len(session.state.completed_objectives) - 8} more")
+                show_objectives("### 🎯 What We Accomplished", session.state.completed_objectives)
                 
                 st.markdown("<br>", unsafe_allow_html=True)
                 if st.button("🔄 Start New Session", type="primary", use_container_width=True):
-                    st.session_state.current_session = None
-                    st.session_state.turn_result = None
-                    st.session_state.input_text = ""
-                    st.rerun()
-            
-            elif session.status == SessionStatus.BUDGET_EXCEEDED:
-                st.error("💸 Budget exceeded!")
-                if st.button("🔄 New Session"):
-                    st.session_state.current_session = None
-                    st.session_state.turn_result = None
-                    st.session_state.input_text = ""
-                    st.rerun()
+                    start_new_session(agent)
             
-            elif session.status == SessionStatus.ABORTED:
-                st.warning("🛑 Session aborted.")
-                if st.button("🔄 New Session"):
-                    st.session_state.current_session = None
-                    st.session_state.turn_result = None
-                    st.session_state.input_text = ""
-                    st.rerun()
+            elif session.status in _TERMINAL_MSGS:
+                kind, message = _TERMINAL_MSGS[session.status]
+                getattr(st, kind)(message)
+                if st.button("🔄 New Session", key="new_session_btn"):
+                    start_new_session(agent)
             
             else:
-                # Get or show turn result
-                turn_result = st.session_state.turn_result
-                
-                if turn_result is None:
-                    # Run a turn to get proposed action
-                    if st.button("▶️ Next Turn", type="primary", use_container_width=True, key="execute_next_turn"):
-                        with st.spinner("Evaluating and planning..."):
-                            turn_result = agent.run_turn()
-                            st.session_state.turn_result = turn_result
-                            st.session_state.current_session = agent.current_session
-                        st.rerun()
-                
-                else:
-                    # Show turn result
-                    # Defensive check for turn_result validity
-                    if not hasattr(turn_result, 'status') or turn_result.status is None:
-                        st.error("⚠️ Invalid turn result - clearing and retrying")
-                        st.session_state.turn_result = None
-                        st.rerun()
-                    
-                    elif turn_result.status == "completed":
-                        # Agent believes goal is achieved - ask user to confirm
-                        
-                        # Show agent's reasoning
-                        st.markdown(f"""
-                        <div class="state-card" style="border-left: 4px solid #10b981;">
-                            <div class="state-label">✅ Agent Assessment (Turn {session.budget.current_turn})</div>
-                            <div class="state-content">{turn_result.reasoning}</div>
-                        </div>
-                        """, unsafe_allow_html=True)
-                        
-                        # Show what was completed
-                        if session.state.completed_objectives:
-                            st.markdown("### 🎯 Completed Objectives")
-                            for obj in session.state.completed_objectives[:8]:
-                                st.markdown(f"✓ {obj}")
-                            if len(session.state.completed_objectives) > 8:
-                                st.caption(f"...and {len(session.state.completed_objectives) - 8} more")
-                        
-                        st.markdown("<br>", unsafe_allow_html=True)
-                        
-                        # Confirmation prompt
-                        st.markdown("""
-                        <div style="background: #fef3c7; 
-                                    border-left: 4px solid #f59e0b; 
-                                    padding: 1.25rem; 
-                                    border-radius: 0.5rem; 
-                                    margin-bottom: 1rem;">
-                            <div style="color: #92400e; font-weight: 600; font-size: 1.1rem; margin-bottom: 0.5rem;">
-                                🤔 Do you agree the goal is achieved?
-                            </div>
-                            <div style="color: #78350f; font-size: 0.95rem;">
-                                The agent believes all objectives have been completed. Please confirm or provide feedback if more work is needed.
-                            </div>
-                        </div>
-                        """, unsafe_allow_html=True)
-                        
-                        # Check if we're showing feedback input
-                        if st.session_state.get('show_completion_feedback', False):
-                            st.markdown("**✏️ What else needs to be done?**")
-                            completion_feedback = st.text_area(
-                                "Please describe what's missing or what should be done differently:",
-                                key="completion_feedback",
-                                placeholder="e.g., 'We still need to test the deployment' or 'The email template needs revision'",
-                                height=120
-                            )
-                            
-                            col_submit_fb, col_cancel_fb = st.columns(2)
-                            
-                            with col_submit_fb:
-                                if st.button("📤 Submit Feedback", type="primary", use_container_width=True, disabled=not completion_feedback, key="submit_completion_feedback"):
-                                    if completion_feedback:
-                                        # Add feedback as a clarification answer saying goal NOT complete
-                                        from models import ClarificationQuestion, ClarificationAnswer
-                                        feedback_question = ClarificationQuestion(
-                                            question="Is the goal achieved?",
-                                            context="Agent believes goal is complete but needs user confirmation",
-                                            options=[]
-                                        )
-                                        feedback_answer = ClarificationAnswer(
-                                            answer=f"No, not yet. {completion_feedback}"
-                                        )
-                                        agent.provide_clarification(feedback_question, feedback_answer.answer)
-                                        
-                                        st.session_state.turn_result = None
-                                        st.session_state.current_session = agent.current_session
-                                        st.session_state.show_completion_feedback = False
-                                        st.toast("Feedback submitted! Agent will continue...", icon="🔄")
-                                        st.rerun()
-                            
-                            with col_cancel_fb:
-                                if st.button("❌ Cancel", use_container_width=True, key="cancel_completion_feedback"):
-                                    st.session_state.show_completion_feedback = False
-                                    st.rerun()
-                        
-                        else:
-                            # Show confirmation buttons
-                            col_yes, col_no = st.columns(2)
-                            
-                            with col_yes:
-                                if st.button("✅ Yes, Goal Achieved!", type="primary", use_container_width=True, key="confirm_goal_achieved"):
-                                    # Mark session as completed and show celebration
-                                    agent.session_manager.complete_session()
-                                    st.session_state.turn_result = None
-                                    st.session_state.current_session = agent.current_session
-                                    st.rerun()
-                            
-                            with col_no:
-                                if st.button("✏️ No, Provide Feedback", use_container_width=True, key="provide_completion_feedback"):
-                                    st.session_state.show_completion_feedback = True
-                                    st.rerun()
-                    
-                    elif turn_result.status == "awaiting_approval":
-                        # Check if this is a batch or single action
-                        is_batch = turn_result.proposed_batch is not None
-                        action = turn_result.proposed_action
-                        
-                        # Normalize to always have a batch (for unified execution API)
-                        if is_batch:
-                            batch = turn_result.proposed_batch
-                        else:
-                            # Create a single-action batch for unified API
-                            batch = BatchAction(
-                                id=generate_id(),
-                                actions=[action],
-                                failure_strategy=FailureStrategy.STOP_ON_ERROR,
-                                reasoning=""
-                            )
-                        
-                        # Show agent's overall reasoning for this turn
-                        if turn_result.reasoning:
-                            st.markdown(f"""
-                            <div class="state-card" style="border-left: 4px solid #6366f1;">
-                                <div class="state-label">🧠 Agent's Analysis (Turn {session.budget.current_turn})</div>
-                                <div class="state-content">{turn_result.reasoning}</div>
-                            </div>
-                            """, unsafe_allow_html=True)
-                        
-                        # Display batch or single action
-                        if is_batch:
-                            st.markdown(render_batch_card(batch), unsafe_allow_html=True)
-                        else:
-                            st.markdown(render_action_card(action), unsafe_allow_html=True)
-                        
-                        # Check if we're in rejection mode
-                        if st.session_state.get('show_rejection_input', False):
-                            # Show rejection feedback input
-                            st.markdown("---")
-                            st.markdown("**✏️ Provide feedback for the agent:**")
-                            rejection_feedback = st.text_area(
-                                "What should the agent do instead?",
-                                key="rejection_feedback",
-                                placeholder="e.g., 'Use email instead of Slack' or 'The parameters are wrong - use X instead of Y'",
-                                height=100
-                            )
-                            
-                            col_submit_rej, col_cancel_rej = st.columns(2)
-                            
-                            with col_submit_rej:
-                                if st.button("📤 Submit Feedback", type="primary", use_container_width=True, disabled=not rejection_feedback, key="submit_rejection_feedback"):
-                                    if rejection_feedback:
-                                        # Handle batch vs single action rejection
-                                        if is_batch:
-                                            # For batches, skip all actions and provide feedback as clarification
-                                            for act in batch.actions:
-                                                agent.skip_action(act)
-                                            # Provide feedback as a clarification to guide next steps
-                                            from models import ClarificationQuestion, ClarificationAnswer
-                                            feedback_question = ClarificationQuestion(
-                                                question="How should I adjust the proposed batch?",
-                                                context=f"User rejected batch of {len(batch.actions)} actions",
-                                                options=[]
-                                            )
-                                            agent.provide_clarification(feedback_question, rejection_feedback)
-                                        else:
-                                            # Single action - use reject_action
-                                            agent.reject_action(action, rejection_feedback)
-                                        
-                                        st.session_state.turn_result = None
-                                        st.session_state.current_session = agent.current_session
-                                        st.session_state.show_rejection_input = False
-                                        st.toast("Feedback submitted! Agent will adjust...", icon="✏️")
-                                        st.rerun()
-                            
-                            with col_cancel_rej:
-                                if st.button("❌ Cancel", use_container_width=True, key="cancel_rejection_feedback"):
-                                    st.session_state.show_rejection_input = False
-                                    st.rerun()
-                        else:
-                            # Show normal action buttons
-                            col_approve, col_reject, col_skip, col_abort = st.columns(4)
-                            
-                            with col_approve:
-                                if st.button("✅ Approve", type="primary", use_container_width=True, key="approve_action"):
-                                    with st.spinner("Executing..."):
-                                        # Always use execute_batch (handles both single and multiple actions)
-                                        batch_result = agent.execute_batch(batch)
-                                        success_msg = f"{batch_result.success_count}/{len(batch_result.results)} succeeded"
-                                        if batch_result.overall_success:
-                                            st.toast(f"Batch completed! {success_msg}", icon="✅")
-                                        else:
-                                            st.toast(f"Batch partial success: {success_msg}", icon="⚠️")
-                                    
-                                    st.session_state.turn_result = None
-                                    st.session_state.current_session = agent.current_session
-                                    st.rerun()
-                            
-                            with col_reject:
-                                if st.button("✏️ Reject with Feedback", use_container_width=True, key="show_rejection_input"):
-                                    st.session_state.show_rejection_input = True
-                                    st.rerun()
-                            
-                            with col_skip:
-                                if st.button("⏭️ Skip", use_container_width=True, key="skip_action"):
-                                    # Handle batch vs single action skip
-                                    if is_batch:
-                                        # Skip all actions in batch
-                                        for act in batch.actions:
-                                            agent.skip_action(act)
-                                    else:
-                                        agent.skip_action(action)
-                                    st.session_state.turn_result = None
-                                    st.session_state.current_session = agent.current_session
-                                    st.rerun()
-                            
-                            with col_abort:
-                                if st.button("🛑 Abort", use_container_width=True, key="abort_session"):
-                                    agent.abort_session()
-                                    st.session_state.turn_result = None
-                                    st.session_state.current_session = agent.current_session
-                                    st.rerun()
-                    
-                    elif turn_result.status == "needs_clarification":
-                        question = turn_result.clarification_question
-                        
-                        # Show agent's reasoning
-                        if turn_result.reasoning:
-                            st.markdown(f"""
-                            <div class="state-card" style="border-left: 4px solid #8b5cf6;">
-                                <div class="state-label">🧠 Agent's Analysis (Turn {session.budget.current_turn})</div>
-                                <div class="state-content">{turn_result.reasoning}</div>
-                            </div>
-                            """, unsafe_allow_html=True)
-                        
-                        # Show clarification card
-                        st.markdown(render_clarification_card(question), unsafe_allow_html=True)
-                        
-                        # Answer input
-                        if question.options:
-                            # If options provided, show as radio buttons
-                            selected_option = st.radio(
-                                "Select your answer:",
-                                options=question.options + ["Other (type below)"],
-                                key="clarification_radio"
-                            )
-                            
-                            # Always show text input for additional details
-                            text_placeholder = "Type your answer..." if selected_option == "Other (type below)" else "Provide additional details for your selected option..."
-                            text_input = st.text_input(
-                                "Additional details:" if selected_option != "Other (type below)" else "Your answer:",
-                                key="clarification_text_with_options",
-                                placeholder=text_placeholder
-                            )
-                            
-                            # Combine selection with text if provided
-                            if selected_option == "Other (type below)":
-                                answer = text_input
-                            else:
-                                # If text is provided, combine it with the selected option
-                                answer = f"{selected_option}\n{text_input}" if text_input else selected_option
-                        else:
-                            # Free text input
-                            answer = st.text_area(
-                                "Your answer:",
-                                key="clarification_text",
-                                placeholder="Type your answer...",
-                                height=100
-                            )
-                        
-                        col_submit, col_skip_q, col_abort_q = st.columns(3)
-                        
-                        with col_submit:
-                            if st.button("📤 Submit Answer", type="primary", use_container_width=True, disabled=not answer):
-                                if answer:
-                                    agent.provide_clarification(question, answer)
-                                    st.session_state.turn_result = None
-                                    st.session_state.current_session = agent.current_session
-                                    st.toast("Answer submitted! Agent will continue...", icon="✅")
-                                    st.rerun()
-                        
-                        with col_skip_q:
-                            if st.button("⏭️ Skip Question", use_container_width=True):
-                                # Submit "No answer provided" and continue
-                                agent.provide_clarification(question, "[User skipped this question]")
-                                st.session_state.turn_result = None
-                                st.session_state.current_session = agent.current_session
-                                st.rerun()
-                        
-                        with col_abort_q:
-                            if st.button("🛑 Abort Session", use_container_width=True):
-                                agent.abort_session()
-                                st.session_state.turn_result = None
-                                st.session_state.current_session = agent.current_session
-                                st.rerun()
-                    
-                    elif turn_result.status == "no_action":
-                        st.warning("No action available")
-                        st.markdown(f"**Reasoning:** {turn_result.reasoning}")
-                        if turn_result.error:
-                            st.error(f"**Issue:** {turn_result.error}")
-                        
-                        if st.button("🔄 Try Again"):
-                            st.session_state.turn_result = None
-                            st.rerun()
-                    
-                    elif turn_result.status == "budget_exceeded":
-                        st.error("💸 Budget exceeded!")
-                        st.session_state.turn_result = None
-                        st.session_state.current_session = agent.current_session
-                        st.rerun()
-                    
-                    elif turn_result.status == "error":
-                        st.error("❌ Agent Error")
-                        st.markdown(f"**Reasoning:** {turn_result.reasoning}")
-                        if turn_result.error:
-                            st.code(turn_result.error, language=None)
-                        
-                        col_retry, col_abort_err = st.columns(2)
-                        with col_retry:
-                            if st.button("🔄 Try Again", type="primary", use_container_width=True, key="retry_after_error"):
-                                st.session_state.turn_result = None
-                                st.rerun()
-                        with col_abort_err:
-                            if st.button("🛑 Abort Session", use_container_width=True, key="abort_after_error"):
-                                agent.abort_session()
-                                st.session_state.turn_result = None
-                                st.session_state.current_session = agent.current_session
-                                st.rerun()
-                    
-                    else:
-                        # Unexpected status - clear and retry
-                        st.error(f"⚠️ Unexpected turn status: {turn_result.status}")
-                        st.markdown(f"**Reasoning:** {turn_result.reasoning if hasattr(turn_result, 'reasoning') else 'N/A'}")
-                        if st.button("🔄 Clear and Retry", key="clear_unexpected_status"):
-                            st.session_state.turn_result = None
-                            st.rerun()
+                render_turn_controls(agent, session)
             
             st.divider()
             
             # Plan section with header
             plan = session.plan
-            confidence_class = "high" if plan.confidence >= 0.7 else ("medium" if plan.confidence >= 0.4 else "low")
-            confidence_label = "High" if plan.confidence >= 0.7 else ("Medium" if plan.confidence >= 0.4 else "Low")
             
             # Check if we just updated the plan (turn result exists)
             plan_updated = st.session_state.turn_result is not None
-            updated_badge = '<span class="plan-updated-badge">UPDATED</span>' if plan_updated else ''
-            
-            st.markdown(f"""
-            <div class="plan-header">
-                <div class="plan-title">
-                    📋 Upcoming Tasks {updated_badge}
-                    <span class="plan-confidence confidence-{confidence_class}">
-                        {confidence_label} Confidence ({plan.confidence:.0%})
-                    </span>
-                </div>
-                <div class="plan-meta">
-                    {len(plan.steps)} steps • Last updated: {plan.last_updated.strftime("%H:%M:%S") if plan.last_updated else "N/A"}
-                </div>
-                {f'<div class="plan-reasoning">💭 {plan.reasoning}</div>' if plan.reasoning else ''}
-            </div>
-            """, unsafe_allow_html=True)
+            st.html(_plan_header_html_cache()(
+                plan.confidence,
+                len(plan.steps),
+                plan.last_updated.strftime("%H:%M:%S") if plan.last_updated else "N/A",
+                plan.reasoning,
+                plan_updated
+            ))
             
             # Plan steps with progress summary
             steps = plan.steps
             if steps:
-                # Calculate progress
-                progress = plan.get_progress()
-                completed = progress["completed"]
-                total = progress["total"]
-                failed = progress["failed"]
-                skipped = progress["skipped"]
-                
                 # Progress bar (outside scrollable container)
-                progress_pct = ((completed + skipped) / total * 100) if total > 0 else 0
-                failed_span = f'<span style="color: #dc2626;">❌ {failed} failed</span>' if failed > 0 else ''
-                st.markdown(f"""<div style="margin-bottom: 1rem;">
-<div style="display: flex; justify-content: space-between; font-size: 0.8rem; color: #64748b; margin-bottom: 0.25rem;">
-<span>✅ {completed} completed</span>
-<span>⬜ {progress["planned"]} remaining</span>
-{failed_span}
-</div>
-<div style="height: 6px; background: #e2e8f0; border-radius: 3px; overflow: hidden;">
-<div style="height: 100%; width: {progress_pct}%; background: linear-gradient(90deg, #10b981 0%, #059669 100%); border-radius: 3px;"></div>
-</div>
-</div>""", unsafe_allow_html=True)
-                
-                # Find current step index for "NEXT" indicator
-                current_idx = None
-                for i, step in enumerate(steps):
-                    if step.status == StepStatus.IN_PROGRESS:
-                        current_idx = i
-                        break
-                    elif step.status == StepStatus.PLANNED and current_idx is None:
-                        # First planned step is next
-                        current_idx = i
-                
-                # Build all plan steps HTML in one string
-                all_steps_html = []
-                for i, step in enumerate(steps):
-                    step_html = render_plan_step(step)
-                    # Add "NEXT" indicator
-                    if i == current_idx and step.status == StepStatus.PLANNED:
-                        step_html = step_html.replace(
-                            '</div>\n    </div>',
-                            '<div style="font-size: 0.75rem; color: #f59e0b; margin-top: 0.25rem;">⬅️ NEXT</div></div>\n    </div>'
-                        )
-                    all_steps_html.append(step_html)
+                progress = plan.get_progress()
+                st.html(_plan_progress_html_cache()(
+                    progress["completed"], progress["planned"], progress["failed"],
+                    progress["skipped"], progress["total"]
+                ))
                 
-                # Render all steps in scrollable container with a single markdown call
-                full_html = '<div class="plan-steps-container">' + ''.join(all_steps_html) + '</div>'
-                st.markdown(full_html, unsafe_allow_html=True)
+                # Render all steps in scrollable container with a single call
+                st.html(render_plan_steps(steps))
             else:
                 st.info("No plan yet.")
             
@@ -1227,76 +1586,67 @@ def main():
                 st.divider()
                 st.markdown("### ✅ Completed Actions")
                 
-                for ca in reversed(session.completed_actions[-10:]):  # Show last 10
-                    # Show tool info and description
-                    tool_info = f"{ca.tool_category}/{ca.tool_name}"
-                    st.markdown(f"""
-                    <div class="history-entry" style="border-left: 3px solid #10b981;">
-                        <div class="history-turn">Turn {ca.turn}</div>
-                        <div style="color: #059669; font-weight: 600; margin-bottom: 0.25rem;">{html.escape(tool_info)}</div>
-                        <div style="color: #374151; font-size: 0.9rem;">{html.escape(ca.description)}</div>
-                        <div style="color: #64748b; margin-top: 0.25rem; font-size: 0.875rem;">✓ {html.escape(ca.result_summary)}</div>
-                    </div>
-                    """, unsafe_allow_html=True)
+                # Entries never change once logged, so each is escaped and formatted once
+                render_completed = _completed_action_html_cache()
+                st.html("".join([
+                    render_completed(ca.turn, ca.tool_category, ca.tool_name, ca.description, ca.result_summary)
+                    for ca in reversed(session.completed_actions[-10:])  # Show last 10
+                ]))
             
             # History section
             if session.history:
                 st.divider()
                 st.markdown("### 📜 Recent History")
                 
-                for entry in reversed(session.history[-3:]):
-                    status = "✅" if entry.result.get("success") else "❌"
-                    st.markdown(f"""
-                    <div class="history-entry">
-                        <div class="history-turn">Turn {entry.turn}</div>
-                        <div class="history-action">{status} {entry.action.tool_category}/{entry.action.tool_name}</div>
-                    </div>
-                    """, unsafe_allow_html=True)
+                # History is append-only: each entry is formatted once, all are sent in one element
+                render_entry = _history_entry_html_cache()
+                st.html("".join([
+                    render_entry(
+                        entry.turn, entry.action.tool_category, entry.action.tool_name,
+                        bool(entry.result.get("success"))
+                    )
+                    for entry in reversed(session.history[-3:])
+                ]))
             
             # Clarification history
             if session.clarifications:
                 st.divider()
                 st.markdown("### 💬 Clarifications")
                 
-                for entry in reversed(session.clarifications[-3:]):
-                    st.markdown(f"""
-                    <div class="history-entry" style="border-left: 3px solid #8b5cf6;">
-                        <div class="history-turn">Turn {entry.turn}</div>
-                        <div style="color: #5b21b6; font-weight: 500;">Q: {entry.question.question[:80]}{'...' if len(entry.question.question) > 80 else ''}</div>
-                        <div style="color: #059669; margin-top: 0.25rem;">A: {entry.answer.answer[:80]}{'...' if len(entry.answer.answer) > 80 else ''}</div>
-                    </div>
-                    """, unsafe_allow_html=True)
+                render_clarification = _clarification_entry_html_cache()
+                st.html("".join([
+                    render_clarification(entry.turn, entry.question.question, entry.answer.answer)
+                    for entry in reversed(session.clarifications[-3:])
+                ]))
             
             # Rejection history
             if session.rejections:
                 st.divider()
                 st.markdown("### ✏️ Rejections")
                 
-                for entry in reversed(session.rejections[-3:]):
-                    action = entry.rejection.rejected_action
-                    st.markdown(f"""
-                    <div class="history-entry" style="border-left: 3px solid #f59e0b;">
-                        <div class="history-turn">Turn {entry.turn}</div>
-                        <div style="color: #b45309; font-weight: 500;">Rejected: {action.tool_category}/{action.tool_name}</div>
-                        <div style="color: #1f2937; margin-top: 0.25rem;">Feedback: {entry.rejection.feedback[:80]}{'...' if len(entry.rejection.feedback) > 80 else ''}</div>
-                    </div>
-                    """, unsafe_allow_html=True)
+                render_rejection = _rejection_entry_html_cache()
+                st.html("".join([
+                    render_rejection(
+                        entry.turn,
+                        entry.rejection.rejected_action.tool_category,
+                        entry.rejection.rejected_action.tool_name,
+                        entry.rejection.feedback
+                    )
+                    for entry in reversed(session.rejections[-3:])
+                ]))
             
             # Agent notes
             if session.agent_notes:
                 st.divider()
                 st.markdown("### 🤖 Agent Notes")
-                for note in session.agent_notes[-3:]:
-                    st.markdown(f'<div class="agent-note">{note}</div>', unsafe_allow_html=True)
+                st.html("".join([
+                    f'<div class="agent-note">{note}</div>' for note in session.agent_notes[-3:]
+                ]))
         
         # New session button at bottom
         st.divider()
         if st.button("🔄 Start New Session", use_container_width=True):
-            st.session_state.current_session = None
-            st.session_state.turn_result = None
-            st.session_state.input_text = ""
-            agent.session_manager.current_session = None
-            st.rerun()
+            start_new_session(agent)
 
 
 if __name__ == "__main__":
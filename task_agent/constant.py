@@ -2,25 +2,37 @@ import os
 
 # Tool Registry
 DEFAULT_TOOL_REGISTRY_URL = os.environ.get("TOOL_REGISTRY_URL", "http://localhost:9999")
+HEALTH_CHECK_TTL_SECONDS = 30  # How long the UI reuses a registry health check
 
 # Model Configuration
 DEFAULT_MODEL = os.environ.get("ANTHROPIC_MODEL", "claude-sonnet-4-5-20250929")
 CLAUDE_MAX_OUTPUT_TOKENS = 8192  # Max tokens Claude can generate per response
+CLAUDE_MAX_RETRIES = 2  # SDK retries for connection errors, 429s and 5xx
+CLAUDE_HTTP_TIMEOUT_SECONDS = 60.0  # Per-operation HTTP timeout (streamed responses reset it per chunk)
 SUMMARIZATION_TEMPERATURE = 0.2  # Lower temperature for more consistent summaries
+ANTHROPIC_LATENCY_BETA = os.environ.get("ANTHROPIC_LATENCY_BETA", "")  # anthropic-beta flag for latency-optimized planning calls (empty = off)
 
 # Token Budget Limits
 CONTEXT_WINDOW_LIMIT = 200_000  # Max tokens for input context (Claude's limit)
 DEFAULT_MAX_TOTAL_TOKENS = 10_000_000  # Default total token budget (cumulative spend)
 DEFAULT_MAX_TURNS = 999  # High default for backward compatibility (not enforced)
 TOKEN_ESTIMATION_DIVISOR = 4  # Rough estimate: chars / 4 ≈ tokens
+CONTEXT_SUMMARIZE_THRESHOLD = 0.8  # Summarize history once the last prompt used this fraction of the window
 
 # History Management
 MAX_CLARIFICATIONS_IN_CONTEXT = 10  # Number of recent clarification Q&As to include
 MAX_EXECUTION_HISTORY_IN_CONTEXT = 20  # Number of recent execution turns to include
+MAX_HISTORY_SUMMARIES = 2  # Older summaries are merged so at most this many are kept
+MAX_MERGED_SUMMARY_CHARS = 4000  # Merged summary text keeps only its newest this-many characters
+MAX_MERGED_KEY_RESULTS = 20  # Merged summaries keep only their newest this-many key results
 
 # Tool Discovery Cache
 MAX_CACHED_FUNCTION_DETAILS = 20  # LRU cache limit for detailed function specifications
+TOOLS_CACHE_TTL_SECONDS = 300  # Max age of the cached registry listing (tools context and validation sets)
+MAX_CONCURRENT_CATEGORY_FETCHES = 8  # Parallel per-category requests when rebuilding the tool listing
+IO_POOL_WORKERS = 16  # Threads in the agent's shared outbound I/O pool
 
 # Batch Action Execution
 MAX_BATCH_SIZE = 10  # Maximum number of actions in a single batch
+MAX_CONCURRENT_REGISTRY_CALLS = 3  # Registry discovery calls run in parallel for all-registry batches
 
@@ -0,0 +1,34 @@
+"""
+JSON helpers shared by the agent and data models.
+Uses orjson when it is installed and falls back to the standard library.
+"""
+
+import json
+from typing import Any
+
+try:
+    import orjson  # Optional: faster (de)serialization of prompt/response JSON
+except ImportError:
+    orjson = None
+
+
+if orjson is not None:
+    def compact_json(obj: Any) -> str:
+        """Serialize to JSON without indentation or padding for prompt text (fewer tokens)."""
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode()
+    
+    def pretty_json(obj: Any) -> str:
+        """Serialize to JSON indented by two spaces (session files)."""
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_INDENT_2).decode()
+    
+    json_loads = orjson.loads
+else:
+    def compact_json(obj: Any) -> str:
+        """Serialize to JSON without indentation or padding for prompt text (fewer tokens)."""
+        return json.dumps(obj, separators=(",", ":"), ensure_ascii=False)
+    
+    def pretty_json(obj: Any) -> str:
+        """Serialize to JSON indented by two spaces (session files)."""
+        return json.dumps(obj, indent=2, ensure_ascii=False)
+    
+    json_loads = json.loads
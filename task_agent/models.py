@@ -8,10 +8,13 @@ from typing import Optional, List, Dict, Any
 from datetime import datetime
 import uuid
 
+from json_utils import compact_json
 from constant import (
     CONTEXT_WINDOW_LIMIT,
     DEFAULT_MAX_TOTAL_TOKENS,
-    DEFAULT_MAX_TURNS
+    DEFAULT_MAX_TURNS,
+    MAX_MERGED_SUMMARY_CHARS,
+    MAX_MERGED_KEY_RESULTS
 )
 
 
@@ -167,25 +170,11 @@ class Plan:
     
     def get_progress(self) -> Dict[str, int]:
         """Get plan progress statistics."""
-        stats = {
-            "total": len(self.steps),
-            "completed": 0,
-            "planned": 0,
-            "in_progress": 0,
-            "failed": 0,
-            "skipped": 0
-        }
+        # Single pass indexed by status value instead of an if/elif chain per step
+        stats = {"total": len(self.steps)}
+        stats.update((status.value, 0) for status in StepStatus)
         for step in self.steps:
-            if step.status == StepStatus.COMPLETED:
-                stats["completed"] += 1
-            elif step.status == StepStatus.PLANNED:
-                stats["planned"] += 1
-            elif step.status == StepStatus.IN_PROGRESS:
-                stats["in_progress"] += 1
-            elif step.status == StepStatus.FAILED:
-                stats["failed"] += 1
-            elif step.status == StepStatus.SKIPPED:
-                stats["skipped"] += 1
+            stats[step.status.value] += 1
         return stats
     
     def to_dict(self) -> Dict[str, Any]:
@@ -462,6 +451,14 @@ class HistoryEntry:
     action: Action
     result: Dict[str, Any]
     timestamp: datetime = field(default_factory=datetime.now)
+    # Compact JSON of the params and the result (minus "success") for prompts,
+    # serialized once here instead of on every prompt build; not persisted
+    params_repr: str = field(init=False, repr=False, compare=False)
+    result_repr: str = field(init=False, repr=False, compare=False)
+    
+    def __post_init__(self):
+        self.params_repr = compact_json(self.action.parameters)
+        self.result_repr = compact_json({k: v for k, v in self.result.items() if k != "success"})
     
     def to_dict(self) -> Dict[str, Any]:
         return {
@@ -501,6 +498,33 @@ class HistorySummary:
             "created_at": self.created_at.isoformat()
         }
     
+    @classmethod
+    def merge(
+        cls,
+        summaries: List["HistorySummary"],
+        max_chars: int = MAX_MERGED_SUMMARY_CHARS,
+        max_key_results: int = MAX_MERGED_KEY_RESULTS
+    ) -> "HistorySummary":
+        """
+        Combine consecutive summaries (oldest first) into one covering their whole range.
+        
+        The text and key results are capped at max_chars / max_key_results, dropping
+        the oldest part first, so repeated merges stay within a fixed size.
+        """
+        summary_text = "\n".join(s.summary_text for s in summaries)
+        if len(summary_text) > max_chars:
+            marker = "[earlier history truncated]\n"
+            summary_text = marker + summary_text[len(summary_text) - max(max_chars - len(marker), 0):]
+        key_results = [r for s in summaries for r in s.key_results]
+        return cls(
+            summary_text=summary_text,
+            turns_covered=sum(s.turns_covered for s in summaries),
+            start_turn=summaries[0].start_turn,
+            end_turn=summaries[-1].end_turn,
+            key_results=key_results[-max_key_results:] if max_key_results > 0 else [],
+            created_at=summaries[-1].created_at
+        )
+    
     @classmethod
     def from_dict(cls, data: Dict[str, Any]) -> "HistorySummary":
         return cls(
@@ -697,6 +721,32 @@ class TurnResult:
         }
 
 
+@dataclass
+class CallStats:
+    """Text and token usage of a single Claude API call."""
+    text: str
+    input_tokens: int  # Uncached prompt tokens
+    output_tokens: int
+    cache_read: int = 0  # Prompt tokens served from the prompt cache
+    cache_creation: int = 0  # Prompt tokens written to the prompt cache
+    
+    @property
+    def context_tokens(self) -> int:
+        """Size of the whole prompt, cached or not."""
+        return self.input_tokens + self.cache_read + self.cache_creation
+    
+    @property
+    def total_tokens(self) -> int:
+        """Prompt plus generated tokens."""
+        return self.context_tokens + self.output_tokens
+    
+    @property
+    def cache_hit_ratio(self) -> float:
+        """Fraction of the prompt read from the cache (0.0 if the prompt was empty)."""
+        context = self.context_tokens
+        return self.cache_read / context if context else 0.0
+
+
 @dataclass
 class ExecutionResult:
     """Result of executing an action."""
@@ -3,10 +3,10 @@ Session Manager for the Smart Agent.
 Handles session persistence and state management.
 """
 
-import json
 import os
+from contextlib import contextmanager
 from datetime import datetime
-from typing import List, Optional, Dict, Any
+from typing import Iterator, List, Optional, Dict, Any, Tuple
 from pathlib import Path
 
 from models import (
@@ -16,6 +16,8 @@ from models import (
     ClarificationQuestion, ClarificationAnswer, ClarificationEntry,
     RejectionFeedback, RejectionEntry, CompletedAction
 )
+from json_utils import json_loads, pretty_json
+from constant import MAX_HISTORY_SUMMARIES, TOKEN_ESTIMATION_DIVISOR
 
 
 class SessionManager:
@@ -27,11 +29,33 @@ class SessionManager:
         self.storage_dir = Path(storage_dir)
         self.storage_dir.mkdir(parents=True, exist_ok=True)
         self.current_session: Optional[Session] = None
+        
+        # Monotonic change counters for the prompt-relevant parts of the current
+        # session, so callers can cache text rendered from them
+        self.plan_version = 0
+        self.history_version = 0
+        self.clarifications_version = 0
+        self.rejections_version = 0
+        
+        # Saves of the current session are deferred while a transaction is open
+        self._transaction_depth = 0
+        self._save_pending = False
     
     def _get_session_path(self, session_id: str) -> Path:
         """Get the file path for a session."""
         return self.storage_dir / f"session_{session_id}.json"
     
+    def mark_plan_changed(self) -> None:
+        """Record a change to the current plan made outside the manager's mutators."""
+        self.plan_version += 1
+    
+    def _mark_all_changed(self) -> None:
+        """Invalidate every version counter (the current session was replaced)."""
+        self.plan_version += 1
+        self.history_version += 1
+        self.clarifications_version += 1
+        self.rejections_version += 1
+    
     # ===================
     # Session CRUD
     # ===================
@@ -72,20 +96,47 @@ class SessionManager:
         )
         
         self.current_session = session
+        self._mark_all_changed()
         self.save_session()
         return session
     
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        """
+        Group several mutations into a single write.
+        
+        Saves of the current session inside the block are deferred and done
+        once when the outermost block exits normally. If it raises, nothing is
+        written (the in-memory changes go out with the next save). Transactions
+        can be nested.
+        """
+        self._transaction_depth += 1
+        completed = False
+        try:
+            yield
+            completed = True
+        finally:
+            self._transaction_depth -= 1
+            if self._transaction_depth == 0 and self._save_pending:
+                self._save_pending = False
+                if completed:
+                    self.save_session()
+    
     def save_session(self, session: Optional[Session] = None) -> bool:
         """Save a session to disk."""
         session = session or self.current_session
         if not session:
             return False
         
+        if self._transaction_depth and session is self.current_session:
+            self._save_pending = True
+            return True
+        
         try:
             session.updated_at = datetime.now()
             path = self._get_session_path(session.id)
-            with open(path, 'w') as f:
-                json.dump(session.to_dict(), f, indent=2)
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(pretty_json(session.to_dict()))
             return True
         except Exception as e:
             print(f"Error saving session: {e}")
@@ -98,23 +149,33 @@ class SessionManager:
             if not path.exists():
                 return None
             
-            with open(path, 'r') as f:
-                data = json.load(f)
+            with open(path, 'rb') as f:
+                data = json_loads(f.read())
             
             session = Session.from_dict(data)
             self.current_session = session
+            self._mark_all_changed()
             return session
         except Exception as e:
             print(f"Error loading session: {e}")
             return None
     
+    def storage_fingerprint(self) -> Tuple[int, int]:
+        """
+        (file count, newest mtime in ns) of the saved sessions.
+        Changes whenever a session is created, saved or deleted, so callers can
+        cache list_sessions() on it; costs a stat per file, no reads.
+        """
+        mtimes = [path.stat().st_mtime_ns for path in self.storage_dir.glob("session_*.json")]
+        return len(mtimes), max(mtimes, default=0)
+    
     def list_sessions(self) -> List[Dict[str, Any]]:
         """List all saved sessions with basic info."""
         sessions = []
         for path in self.storage_dir.glob("session_*.json"):
             try:
-                with open(path, 'r') as f:
-                    data = json.load(f)
+                with open(path, 'rb') as f:
+                    data = json_loads(f.read())
                 
                 goal_text = data.get("goal", {}).get("original_text", "")
                 sessions.append({
@@ -160,6 +221,7 @@ class SessionManager:
         if self.current_session:
             plan.last_updated = datetime.now()
             self.current_session.plan = plan
+            self.plan_version += 1
             self.save_session()
     
     def set_plan_from_data(self, plan_data: List[Dict[str, Any]], reasoning: str = "", confidence: float = 0.5) -> Plan:
@@ -194,6 +256,7 @@ class SessionManager:
         )
         
         self.current_session.plan = plan
+        self.plan_version += 1
         self.save_session()
         return plan
     
@@ -225,6 +288,7 @@ class SessionManager:
                 # Note: Completed actions are now created in add_history_entry()
                 # This ensures ALL actions are tracked, not just those linked to plan steps
                 
+                self.plan_version += 1
                 self.save_session()
                 return step
         return None
@@ -253,6 +317,7 @@ class SessionManager:
             self.current_session.plan.steps.append(new_step)
         
         self.current_session.plan.last_updated = datetime.now()
+        self.plan_version += 1
         self.save_session()
         return new_step
     
@@ -268,6 +333,7 @@ class SessionManager:
         
         if len(self.current_session.plan.steps) < original_len:
             self.current_session.plan.last_updated = datetime.now()
+            self.plan_version += 1
             self.save_session()
             return True
         return False
@@ -303,9 +369,8 @@ class SessionManager:
                         description = step.description
                         break
             
-            # Extract result summary (everything except "success")
-            result_data = {k: v for k, v in result.items() if k != "success"}
-            result_str = json.dumps(result_data)
+            # Extract result summary (everything except "success", serialized on the entry)
+            result_str = entry.result_repr
             result_summary = result_str[:200] if result_str else "Success"
             
             completed_action = CompletedAction(
@@ -318,9 +383,51 @@ class SessionManager:
             )
             self.current_session.completed_actions.append(completed_action)
         
+        self.history_version += 1
         self.save_session()
         return entry
     
+    def commit_execution(
+        self,
+        action: Action,
+        result: Dict[str, Any],
+        tokens_used: Optional[int] = None
+    ) -> Tuple[HistoryEntry, int]:
+        """
+        Record an executed action in one write: history entry (and completed
+        action), plan step status, turn counter and token usage.
+        
+        tokens_used defaults to an estimate from the serialized result.
+        Returns the history entry and the tokens charged.
+        """
+        with self.transaction():
+            entry = self.add_history_entry(action, result)
+            
+            # Update plan step status based on result
+            if action.plan_step_id:
+                if result.get("success"):
+                    # Everything except the "success" field, as serialized on the entry
+                    self.update_step_status(
+                        action.plan_step_id,
+                        StepStatus.COMPLETED,
+                        result=entry.result_repr
+                    )
+                else:
+                    self.update_step_status(
+                        action.plan_step_id,
+                        StepStatus.FAILED,
+                        error=result.get("error", "Unknown error")
+                    )
+            
+            self.increment_turn()
+            
+            if tokens_used is None:
+                # Rough estimate from the result's serialized size
+                tokens_used = len(entry.result_repr) // TOKEN_ESTIMATION_DIVISOR
+            self.add_tokens_used(tokens_used)
+        
+        return entry, tokens_used
+    
     def get_recent_history(self, n: int = 5) -> List[HistoryEntry]:
         """Get the N most recent history entries."""
         if not self.current_session:
@@ -328,9 +435,23 @@ class SessionManager:
         return self.current_session.history[-n:]
     
     def add_history_summary(self, summary: HistorySummary) -> None:
-        """Add a compressed history summary."""
+        """
+        Add a compressed history summary.
+        
+        Keeps at most MAX_HISTORY_SUMMARIES: older summaries are merged into a
+        single leading one, whose text and key results HistorySummary.merge caps,
+        so the summary preamble stays bounded in long sessions (each of the newest
+        summaries is as long as the summarizer made it).
+        """
         if self.current_session:
-            self.current_session.history_summaries.append(summary)
+            summaries = self.current_session.history_summaries
+            summaries.append(summary)
+            if len(summaries) > MAX_HISTORY_SUMMARIES:
+                # Newest summaries kept as-is; with a limit of 1 (or less) everything is merged
+                split = len(summaries) - max(MAX_HISTORY_SUMMARIES - 1, 0)
+                merged = HistorySummary.merge(summaries[:split])
+                self.current_session.history_summaries = [merged, *summaries[split:]]
+            self.history_version += 1
             self.save_session()
     
     def clear_old_history(self, keep_recent: int = 3) -> int:
@@ -343,6 +464,7 @@ class SessionManager:
         
         removed_count = len(self.current_session.history) - keep_recent
         self.current_session.history = self.current_session.history[-keep_recent:]
+        self.history_version += 1
         self.save_session()
         return removed_count
     
@@ -461,6 +583,7 @@ class SessionManager:
         )
         
         self.current_session.clarifications.append(entry)
+        self.clarifications_version += 1
         self.save_session()
         return entry
     
@@ -491,6 +614,7 @@ class SessionManager:
         )
         
         self.current_session.rejections.append(entry)
+        self.rejections_version += 1
         self.save_session()
         return entry
     
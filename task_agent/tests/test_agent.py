@@ -0,0 +1,101 @@
+"""Tests for agent prompt building and tool-cache bookkeeping"""
+
+import pytest
+
+import agent
+from agent import ContinuousPlanningAgent
+from models import CachedFunctionDetail
+from session_manager import SessionManager
+from tool_client import ToolRegistryClient, REGISTRY_TOOLS_GUIDE
+
+
+class FakeToolClient(ToolRegistryClient):
+    """Registry client answering from memory instead of the HTTP API"""
+    
+    FUNCTIONS = {
+        "email": ["send_email", "list_inbox"],
+        "slack": ["send_message"],
+        "crm": ["get_contact"],
+    }
+    
+    def __init__(self):
+        super().__init__("http://registry.invalid")
+        self.calls = []
+    
+    def list_categories(self):
+        return list(self.FUNCTIONS)
+    
+    def count_functions(self):
+        # Larger than the listed functions, as with a registry that paginates its listings
+        return 42
+    
+    def get_functions_by_category(self, category):
+        return [{"name": name, "category": category} for name in self.FUNCTIONS[category]]
+    
+    def registry_get_function(self, function_name):
+        self.calls.append(("registry_get_function", function_name))
+        return {"success": True, "result": {"name": function_name, "category": "email"}}
+
+
+@pytest.fixture
+def planner(tmp_path, monkeypatch):
+    """Agent with an active session, a fake registry and a dummy API key"""
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "test-key-0000")
+    sm = SessionManager(str(tmp_path))
+    sm.create_session("Email the weekly report")
+    return ContinuousPlanningAgent(sm, FakeToolClient())
+
+
+def test_initial_plan_system_prompt_has_single_braces():
+    """The initial-plan prompt is not formatted, so its JSON schema must use plain braces"""
+    blocks = ContinuousPlanningAgent._build_system_prompt(agent._INITIAL_PLAN_SYSTEM_PROMPT, "tools")
+    text = ContinuousPlanningAgent._blocks_text(blocks)
+    
+    assert "{{" not in text
+    assert "}}" not in text
+    assert '"plan": [' in text
+
+
+def test_cached_function_lookup_touches_lru_only_when_recorded(planner):
+    """Fetching reads the cache; the last-used turn is bumped by _record_registry_result"""
+    session = planner.current_session
+    session.cached_function_details["email/send_email"] = CachedFunctionDetail(
+        category="email", name="send_email", details={"name": "send_email"}, last_used_turn=0
+    )
+    session.budget.current_turn = 5
+    params = {"function_name": "send_email"}
+    
+    result = planner._fetch_registry_tool("registry_get_function", params)
+    
+    assert result["result"] == {"name": "send_email"}
+    assert planner.tool_client.calls == []
+    assert session.cached_function_details["email/send_email"].last_used_turn == 0
+    
+    planner._record_registry_result("registry_get_function", params, result)
+    
+    assert session.cached_function_details["email/send_email"].last_used_turn == 5
+    assert "cached" not in result
+
+
+def test_compact_tools_context_keeps_meta_tool_parameters(planner):
+    """Once a category is used, the compact overview still documents the meta-tool parameters"""
+    full = planner._get_evaluation_tools_context()
+    assert "Categories: email, slack, crm" in full
+    
+    planner._mark_category_used("email")
+    compact = planner._get_evaluation_tools_context()
+    
+    assert compact != full
+    assert "Categories used this session: email" in compact
+    assert "Other categories: crm, slack" in compact
+    assert REGISTRY_TOOLS_GUIDE in compact
+    for param in ("q: str (required)", "category: str (required)", "function_name: str (required)"):
+        assert param in compact
+    # The registry's own total, not the size of the validation snapshot
+    assert "Total Functions: 42" in compact
+
+
+def test_compact_tools_context_can_be_disabled(planner):
+    planner.compact_tools_context = False
+    planner._mark_category_used("email")
+    assert "Categories: email, slack, crm" in planner._get_evaluation_tools_context()
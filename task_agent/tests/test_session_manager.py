@@ -0,0 +1,262 @@
+"""Tests for session manager"""
+
+import pytest
+
+import session_manager
+from constant import MAX_MERGED_SUMMARY_CHARS, MAX_MERGED_KEY_RESULTS, TOKEN_ESTIMATION_DIVISOR
+from models import Action, HistorySummary, StepStatus
+from session_manager import SessionManager
+
+
+@pytest.fixture
+def manager(tmp_path):
+    """Session manager with an active session, storing under a temp dir"""
+    sm = SessionManager(str(tmp_path))
+    sm.create_session("Test goal")
+    return sm
+
+
+def make_summary(start: int, end: int) -> HistorySummary:
+    return HistorySummary(
+        summary_text=f"turns {start}-{end}",
+        turns_covered=end - start + 1,
+        start_turn=start,
+        end_turn=end,
+        key_results=[f"result {end}"]
+    )
+
+
+def test_add_history_summary_merges_older_with_default_limit(manager):
+    """Older summaries are merged so at most MAX_HISTORY_SUMMARIES remain"""
+    limit = session_manager.MAX_HISTORY_SUMMARIES
+    for i in range(limit + 2):
+        manager.add_history_summary(make_summary(i * 10 + 1, i * 10 + 10))
+    
+    summaries = manager.current_session.history_summaries
+    assert len(summaries) == limit
+    assert summaries[0].start_turn == 1
+    assert summaries[-1].end_turn == (limit + 1) * 10 + 10
+    assert sum(s.turns_covered for s in summaries) == (limit + 2) * 10
+
+
+def test_add_history_summary_with_limit_of_one(manager, monkeypatch):
+    """With a limit of 1 every summary is merged into a single one"""
+    monkeypatch.setattr(session_manager, "MAX_HISTORY_SUMMARIES", 1)
+    manager.add_history_summary(make_summary(1, 5))
+    assert len(manager.current_session.history_summaries) == 1
+    
+    manager.add_history_summary(make_summary(6, 9))
+    manager.add_history_summary(make_summary(10, 12))
+    
+    summaries = manager.current_session.history_summaries
+    assert len(summaries) == 1
+    assert summaries[0].start_turn == 1
+    assert summaries[0].end_turn == 12
+    assert summaries[0].turns_covered == 12
+    assert summaries[0].summary_text == "turns 1-5\nturns 6-9\nturns 10-12"
+
+
+@pytest.fixture
+def writes(monkeypatch):
+    """Count of session files written (each save serializes once)"""
+    count = {"n": 0}
+    real_pretty_json = session_manager.pretty_json
+    
+    def counting_pretty_json(obj):
+        count["n"] += 1
+        return real_pretty_json(obj)
+    
+    monkeypatch.setattr(session_manager, "pretty_json", counting_pretty_json)
+    return count
+
+
+@pytest.fixture
+def step_action(manager):
+    """Action linked to the first step of a two-step plan"""
+    plan = manager.set_plan_from_data([{"description": "Send report"}, {"description": "Notify team"}])
+    return Action(
+        id="a1",
+        plan_step_id=plan.steps[0].id,
+        tool_category="email",
+        tool_name="send_email",
+        parameters={"to": "team@example.com"}
+    )
+
+
+def test_commit_execution_success(manager, step_action, writes):
+    """A successful action is logged, completes its step and is charged, in one write"""
+    result = {"success": True, "message_id": "m-1"}
+    
+    entry, tokens = manager.commit_execution(step_action, result, tokens_used=42)
+    
+    session = manager.current_session
+    assert writes["n"] == 1
+    assert entry.turn == 0
+    assert session.history == [entry]
+    assert session.budget.current_turn == 1
+    assert session.budget.used_tokens == 42
+    assert tokens == 42
+    
+    step = session.plan.steps[0]
+    assert step.status == StepStatus.COMPLETED
+    assert step.result == entry.result_repr == '{"message_id":"m-1"}'
+    assert session.plan.steps[1].status == StepStatus.PLANNED
+    
+    completed = session.completed_actions
+    assert len(completed) == 1
+    assert completed[0].description == "Send report"
+    assert completed[0].step_id == step.id
+    assert completed[0].turn == 0
+
+
+def test_commit_execution_failure(manager, step_action, writes):
+    """A failed action fails its step, records no completed action and still uses a turn"""
+    result = {"success": False, "error": "SMTP timeout"}
+    
+    entry, tokens = manager.commit_execution(step_action, result)
+    
+    session = manager.current_session
+    assert writes["n"] == 1
+    assert session.history == [entry]
+    assert session.completed_actions == []
+    assert session.budget.current_turn == 1
+    
+    step = session.plan.steps[0]
+    assert step.status == StepStatus.FAILED
+    assert step.error == "SMTP timeout"
+    assert step.result is None
+    
+    # Without tokens_used the charge is estimated from the serialized result
+    assert tokens == len(entry.result_repr) // TOKEN_ESTIMATION_DIVISOR
+    assert session.budget.used_tokens == tokens
+
+
+def test_commit_execution_is_persisted(manager, step_action):
+    """The single deferred write contains every part of the commit"""
+    manager.commit_execution(step_action, {"success": True, "id": 7}, tokens_used=5)
+    
+    loaded = manager.load_session(manager.current_session.id)
+    assert len(loaded.history) == 1
+    assert loaded.budget.current_turn == 1
+    assert loaded.budget.used_tokens == 5
+    assert loaded.plan.steps[0].status == StepStatus.COMPLETED
+    assert len(loaded.completed_actions) == 1
+
+
+def test_session_file_is_utf8_regardless_of_locale(tmp_path, monkeypatch):
+    """Non-ASCII text round-trips even when the locale encoding is not UTF-8"""
+    def ascii_locale_open(file, mode='r', *args, encoding=None, **kwargs):
+        if 'b' not in mode and encoding is None:
+            encoding = 'ascii'
+        return open(file, mode, *args, encoding=encoding, **kwargs)
+    
+    monkeypatch.setattr(session_manager, "open", ascii_locale_open, raising=False)
+    sm = SessionManager(str(tmp_path))
+    session = sm.create_session("Résumé für Zoë — 日本")
+    
+    loaded = sm.load_session(session.id)
+    assert loaded is not None
+    assert loaded.goal.original_text == "Résumé für Zoë — 日本"
+
+
+def test_transaction_saves_once(manager, writes):
+    """Saves inside a transaction are deferred to a single write on exit"""
+    with manager.transaction():
+        manager.increment_turn()
+        manager.add_tokens_used(10)
+        assert writes["n"] == 0
+    assert writes["n"] == 1
+
+
+def test_nested_transaction_saves_once_at_outermost_exit(manager, writes):
+    """Only the outermost transaction writes"""
+    with manager.transaction():
+        with manager.transaction():
+            manager.increment_turn()
+        assert writes["n"] == 0
+        manager.add_tokens_used(10)
+    assert writes["n"] == 1
+
+
+def test_transaction_without_changes_does_not_save(manager, writes):
+    with manager.transaction():
+        pass
+    assert writes["n"] == 0
+
+
+def test_transaction_does_not_save_on_error(manager, writes):
+    """A transaction that raises writes nothing"""
+    with pytest.raises(RuntimeError):
+        with manager.transaction():
+            manager.increment_turn()
+            raise RuntimeError("boom")
+    assert writes["n"] == 0
+    
+    # Later saves are written normally again
+    manager.increment_turn()
+    assert writes["n"] == 1
+
+
+def test_nested_transaction_error_caught_by_outer_saves_once(manager, writes):
+    """An inner failure handled inside the outer block still ends in one write"""
+    with manager.transaction():
+        manager.increment_turn()
+        with pytest.raises(RuntimeError):
+            with manager.transaction():
+                manager.add_tokens_used(10)
+                raise RuntimeError("boom")
+    assert writes["n"] == 1
+
+
+def test_history_summary_merge():
+    """Merging covers the whole range, oldest first"""
+    merged = HistorySummary.merge([make_summary(1, 4), make_summary(5, 6), make_summary(7, 10)])
+    
+    assert merged.summary_text == "turns 1-4\nturns 5-6\nturns 7-10"
+    assert merged.turns_covered == 10
+    assert merged.start_turn == 1
+    assert merged.end_turn == 10
+    assert merged.key_results == ["result 4", "result 6", "result 10"]
+
+
+def test_history_summary_merge_single():
+    summary = make_summary(3, 8)
+    merged = HistorySummary.merge([summary])
+    assert merged.to_dict() == summary.to_dict()
+
+
+def test_history_summary_merge_caps_text_and_key_results():
+    """Merged text and key results keep their newest part within the limits"""
+    summaries = [
+        HistorySummary(
+            summary_text=f"summary {i} " + "x" * 500,
+            turns_covered=1,
+            start_turn=i,
+            end_turn=i,
+            key_results=[f"result {i}a", f"result {i}b"]
+        )
+        for i in range(1, 41)
+    ]
+    
+    merged = HistorySummary.merge(summaries)
+    
+    assert len(merged.summary_text) <= MAX_MERGED_SUMMARY_CHARS
+    assert merged.summary_text.startswith("[earlier history truncated]")
+    assert merged.summary_text.endswith(summaries[-1].summary_text)
+    assert len(merged.key_results) == MAX_MERGED_KEY_RESULTS
+    assert merged.key_results[-1] == "result 40b"
+    assert merged.turns_covered == 40
+
+
+def test_add_history_summary_preamble_stays_bounded(manager, monkeypatch):
+    """However many summaries are added, the merged leading one stays under the cap"""
+    monkeypatch.setattr(session_manager, "MAX_HISTORY_SUMMARIES", 1)
+    for i in range(50):
+        manager.add_history_summary(HistorySummary(
+            summary_text="y" * 300, turns_covered=1, start_turn=i + 1, end_turn=i + 1
+        ))
+    
+    summaries = manager.current_session.history_summaries
+    assert len(summaries) == 1
+    assert len(summaries[0].summary_text) <= MAX_MERGED_SUMMARY_CHARS
+    assert summaries[0].turns_covered == 50
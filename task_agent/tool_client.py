@@ -9,12 +9,34 @@ import logging
 import httpx
 from typing import List, Dict, Any, Optional
 from models import ToolInfo
+from json_utils import compact_json, json_loads
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
 from constant import DEFAULT_TOOL_REGISTRY_URL
 
+# How to call the registry meta-tools; part of every tools overview sent to the agent
+REGISTRY_TOOLS_GUIDE = """TO DISCOVER FUNCTIONS, use these registry tools:
+
+[registry] - Meta-tools for discovering available functions
+  - registry_search: Search functions by keyword
+      Parameters: q: str (required) - search query
+      Example: {"q": "slack message"} → finds slack_send_message, etc.
+  
+  - registry_list_category: List all functions in a category  
+      Parameters: category: str (required)
+      Example: {"category": "salesforce"} → lists all Salesforce functions
+  
+  - registry_get_function: Get full details of a specific function
+      Parameters: function_name: str (required)
+      Example: {"function_name": "slack_send_message"} → returns params, description
+
+WORKFLOW:
+1. Use registry_search or registry_list_category to find relevant functions
+2. Use registry_get_function to get exact parameter names before calling
+3. Then call the actual function with correct parameters"""
+
 class ToolRegistryClient:
     """
     Client for interacting with the Function Call Registry API.
@@ -154,10 +176,12 @@ class ToolRegistryClient:
             - HTTP 200 response
             - Response is valid JSON
             - JSON has "success" field set to true
+            When a response body was parsed, "_raw_len" holds its size in bytes
+            so callers can size the result without re-serializing it.
         """
         url = f"{self.base_url}/{category}/{function_name}"
         logger.info(f"Executing function: {category}/{function_name}")
-        logger.info(f"Parameters: {json.dumps(params or {})}")
+        logger.info(f"Parameters: {compact_json(params or {})}")
         
         try:
             # Always send a JSON body (API requires it even for no-param functions)
@@ -169,11 +193,12 @@ class ToolRegistryClient:
             
             # Check HTTP status
             response.raise_for_status()
+            raw_len = len(response.content)
             
             # Try to parse JSON
             try:
-                result_data = response.json()
-            except json.JSONDecodeError as e:
+                result_data = json_loads(response.content)
+            except ValueError as e:  # JSONDecodeError, or undecodable bytes
                 logger.error(f"Response is not valid JSON: {e}")
                 return {
                     "success": False,
@@ -193,7 +218,7 @@ class ToolRegistryClient:
                 # If result is a JSON string, parse it
                 if isinstance(inner_result, str):
                     try:
-                        inner_result = json.loads(inner_result)
+                        inner_result = json_loads(inner_result)
                     except json.JSONDecodeError:
                         # Not JSON, keep as string
                         pass
@@ -202,6 +227,7 @@ class ToolRegistryClient:
                 if isinstance(inner_result, dict):
                     unwrapped = {"success": success_value}
                     unwrapped.update(inner_result)
+                    unwrapped["_raw_len"] = raw_len
                     logger.info(f"Function executed, success={success_value}, unwrapped nested result")
                     return unwrapped
                 else:
@@ -209,7 +235,8 @@ class ToolRegistryClient:
                     logger.info(f"Function executed, success={success_value}, result is non-dict type")
                     return {
                         "success": success_value,
-                        "result": inner_result
+                        "result": inner_result,
+                        "_raw_len": raw_len
                     }
             
             # No nested result field, return response as-is (removing function_name if present)
@@ -217,6 +244,7 @@ class ToolRegistryClient:
             for k, v in result_data.items():
                 if k not in ("success", "function_name"):
                     cleaned_result[k] = v
+            cleaned_result["_raw_len"] = raw_len
             
             logger.info(f"Function executed, success={success_value}")
             return cleaned_result
@@ -234,46 +262,40 @@ class ToolRegistryClient:
                 "error": str(e)
             }
     
-    def get_tools_summary(self) -> str:
+    def count_functions(self) -> Optional[int]:
+        """Total number of functions in the registry, or None if it can't be read."""
+        try:
+            response = self.client.get(f"{self.base_url}/functions")
+            response.raise_for_status()
+            data = response.json()
+            return data.get("total", len(data.get("functions", [])))
+        except Exception:
+            return None
+    
+    def get_tools_summary(
+        self,
+        categories: Optional[List[str]] = None,
+        total_count: Optional[int] = None
+    ) -> str:
         """
         Get a HIGH-LEVEL summary of the tool registry.
         Does NOT include individual function details - agent should use
         registry discovery tools to find specific functions.
+        
+        categories and total_count are fetched when not given.
         """
-        categories = self.list_categories()
+        if categories is None:
+            categories = self.list_categories()
         
         # Get total count without loading all details
-        try:
-            response = self.client.get(f"{self.base_url}/functions")
-            response.raise_for_status()
-            data = response.json()
-            total_count = data.get("total", len(data.get("functions", [])))
-        except Exception:
-            total_count = "unknown"
+        if total_count is None:
+            total_count = self.count_functions()
         
         summary = f"""TOOL REGISTRY OVERVIEW:
-Total Functions: {total_count}
+Total Functions: {total_count if total_count is not None else 'unknown'}
 Categories: {', '.join(categories) if categories else 'N/A'}
 
-TO DISCOVER FUNCTIONS, use these registry tools:
-
-[registry] - Meta-tools for discovering available functions
-  - registry_search: Search functions by keyword
-      Parameters: q: str (required) - search query
-      Example: {{"q": "slack message"}} → finds slack_send_message, etc.
-  
-  - registry_list_category: List all functions in a category  
-      Parameters: category: str (required)
-      Example: {{"category": "salesforce"}} → lists all Salesforce functions
-  
-  - registry_get_function: Get full details of a specific function
-      Parameters: function_name: str (required)
-      Example: {{"function_name": "slack_send_message"}} → returns params, description
-
-WORKFLOW:
-1. Use registry_search or registry_list_category to find relevant functions
-2. Use registry_get_function to get exact parameter names before calling
-3. Then call the actual function with correct parameters"""
+{REGISTRY_TOOLS_GUIDE}"""
         
         return summary
     